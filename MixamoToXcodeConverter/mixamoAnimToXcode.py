@@ -1,48 +1,65 @@
+import hashlib
+import json
 import os
 import shutil
-import subprocess
 import sys
 import zipfile
 
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from os.path import abspath, expanduser
 
-
-try:
-    from subprocess import DEVNULL  # python3
-except ImportError:
-    DEVNULL = open(os.devnull, 'wb')
-
 # Custom Files
-from mixamoToXcode import *
+from mixamoCharactersToXcode import *
 from Logger import *
 
 #----------------------------------------------------------------------------------------------------------------
 ############################################### CUSTOMIZABLE SETTINGS ###########################################
 #----------------------------------------------------------------------------------------------------------------
 DELETE_TEXTURES = True #When True, it will delete animations with textures
+JOBS = os.cpu_count() or 1 #Animations converted at the same time. Override with --jobs <count>
+CONVERSION_CACHE_PATH = abspath(expanduser("~/") + '/.mixamoAnimToXcodeCache.json') #Zips already converted. Bypass with --force
+
+#----------------------------------------------------------------------------------------------------------------
+#################################################### Constants ##################################################
+#----------------------------------------------------------------------------------------------------------------
+CONVERTER_VERSION = 1 #Bump when a change to the conversion changes the converted .dae files, so they get converted again
+HASH_CHUNK_SIZE = 1024 * 1024
 
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Objects ####################################################
 #----------------------------------------------------------------------------------------------------------------
+class AnimationConversionError(Exception):
+    """Raised when an animation zip cannot be converted, so a batch can continue with the other zips"""
 
+conversionCache = {} #Cache key of a zip -> its converted .dae's path and hash, read by every worker
+isForced = False #When True, zips are converted even if the cache has them
 
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Methods ####################################################
 #----------------------------------------------------------------------------------------------------------------
 def validateAndGetInput():
-    """Validates inputs and returns the path to convert and new animation name"""
-    if len(sys.argv) < 2:
-        LOGE("Error Usage: python3 mixamoAnimToXcode.py <list_of_files> <optional_new_animation_name>")
+    """Validates inputs and returns the paths to convert, new animation name, number of jobs and if the cache is bypassed"""
+    arguments = sys.argv[1:]
+    jobCount = JOBS
+    force = "--force" in arguments
+    if force:
+        arguments.remove("--force")
+    if "--jobs" in arguments:
+        index = arguments.index("--jobs")
+        if index + 1 >= len(arguments) or not arguments[index + 1].isdigit() or int(arguments[index + 1]) < 1:
+            LOGE("Error Usage: --jobs must be followed by a number of jobs of at least 1")
+            sys.exit(1)
+        jobCount = int(arguments[index + 1])
+        del arguments[index:index + 2]
+    if len(arguments) < 1:
+        LOGE("Error Usage: python3 mixamoAnimToXcode.py [--jobs <count>] [--force] <list_of_files> <optional_new_animation_name>")
         LOGW("Running this script requires 1-2 additional parameters")
         sys.exit(1)
-    # Defaults to converting user's Downloads folder if path is not provided
     pathsToConvert = []
     newAnimationName = ""
-    for (index, arg) in enumerate(sys.argv):
-        if index == 0:
-            continue
-        isLastIndex = index == len(sys.argv) - 1
+    for (index, arg) in enumerate(arguments):
+        isLastIndex = index == len(arguments) - 1
         if isLastIndex:
             if (isFolder(arg) or isFile(arg)) and exist(arg):
                 pathsToConvert.append(arg)
@@ -51,14 +68,15 @@ def validateAndGetInput():
                 newAnimationName = arg
         else:
             pathsToConvert.append(arg)
-    LOGA(f"Converting paths: {pathsToConvert} and optionally renaming zip file to {newAnimationName}")
-    return pathsToConvert, newAnimationName
+    LOGA(f"Converting paths: {pathsToConvert} with {jobCount} jobs and optionally renaming zip file to {newAnimationName}")
+    return pathsToConvert, newAnimationName, jobCount, force
 
 def prepareDaeAnimation(daePath, newAnimationName):
-    """Unzips daePath and returns the unzipped dae file's path"""
+    """Unzips daePath and returns the unzipped dae file's path. Raises AnimationConversionError if it fails"""
     if not getExtensionFromPath(daePath) == ".zip":
-        LOGE(f"Failed to unzip path: {daePath}")
-    destinationPath = unzipFile(daePath, isAnimation=True)
+        raise AnimationConversionError(f"Failed to unzip path: {daePath}")
+    # Textures would only be deleted again, so skip extracting them
+    destinationPath, unzippedDaePaths = unzipFile(daePath, isAnimation=True, onlyDae=DELETE_TEXTURES)
     folderName = getFolderFromPath(daePath)
     isNewNameEmpty = len(newAnimationName) == 0
     zipName = getNameFromPath(daePath)
@@ -75,19 +93,13 @@ def prepareDaeAnimation(daePath, newAnimationName):
         #It will go here if zip file was renamed. It does not work due to extracting 
         #Fix by updating unzippedDaePath to the first .dae found
         LOG(f"Looking for dae in {destinationPath} becase {zipName}=={daeName}")
-        for root, dirs, files in os.walk(destinationPath):
-            for file in files:
-                filePath = os.path.join(root, file)
-                if getExtensionFromPath(filePath) == ".dae":
-                    # unzippedDaePath = filePath
-                    LOGD(f"Found the animation file at {filePath} and renaming to {unzippedDaePath}")
-                    moveFile(filePath, unzippedDaePath)
-                    break
-            break
+        if unzippedDaePaths:
+            filePath = unzippedDaePaths[0]
+            LOGD(f"Found the animation file at {filePath} and renaming to {unzippedDaePath}")
+            moveFile(filePath, unzippedDaePath)
 
     if not exist(unzippedDaePath):
-        LOGE(f"Missing dae file {unzippedDaePath} from {daePath}")
-        sys.exit(1)
+        raise AnimationConversionError(f"Missing dae file {unzippedDaePath} from {daePath}")
     #Handle animations with textures
     LOGA(f"Unzipped .dae file has textures for {unzippedDaePath}. Deleting unneeded texture files = {DELETE_TEXTURES}")
     if DELETE_TEXTURES:
@@ -99,30 +111,118 @@ def prepareDaeAnimation(daePath, newAnimationName):
         deleteAllFromPath(f"{folderName}/{zipName}.zip")
         LOGD(f"Finished moving unzipped .dae from {unzippedDaePath} into {finalDaePath} and deleted unneeded files")
         unzippedDaePath = finalDaePath            
-    executeConvertToXcodeColladaWorkflow(unzippedDaePath)
+    convertToXcodeCollada(unzippedDaePath)
     LOG(f"Finished preparing dae animations from {daePath} into {unzippedDaePath}")
     return unzippedDaePath
 
-def handleZippedDae(path, newAnimationName):
-    # Handle zip file
-    if getExtensionFromPath(path) == ".zip":
-        prepareDaeAnimation(path, newAnimationName)
-        print("\n\n")
+def getZippedDaePaths(path, includeSubfolders = False):
+    """Returns the zip files in the folder at path, including its subdirectories if includeSubfolders is True"""
+    return getZipPaths(scanInventory(path, maxDepth=None if includeSubfolders else 0))
+
+def getZipPaths(inventory, isInAnimationsFolder = None):
+    """Returns the paths of every zip file in inventory, optionally only the ones in or out of an animations folder"""
+    zipItems = [item for item in inventory.items if item.kind in (InventoryKind.characterZip, InventoryKind.animationZip)]
+    return [item.path for item in zipItems if isInAnimationsFolder is None or item.isInAnimationsFolder == isInAnimationsFolder]
+
+def getFileHash(path):
+    fileHash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+def loadConversionCache(cachePath):
+    """Returns the cache entries saved at cachePath, or none if it is missing or unreadable"""
+    try:
+        with open(cachePath, 'r') as file:
+            return json.load(file)['conversions']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def saveConversionCache(cachePath, entries):
+    """Atomically writes the cache entries to cachePath"""
+    tempPath = getTempPath(cachePath)
+    with open(tempPath, 'w') as file:
+        json.dump({'conversions': entries}, file, indent=2)
+    os.replace(tempPath, cachePath)
 
-def handleAnimationsFolder(path):
-    """Unzipped and convert all zipped dae files including its subdirectories"""
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            filePath = os.path.join(root, file)
-            handleZippedDae(filePath, newAnimationName)
+def initConversionWorker(cacheEntries, force):
+    """Sets the cache used by convertAnimation, also in worker processes"""
+    global conversionCache, isForced
+    conversionCache = cacheEntries
+    isForced = force
+
+def getConvertedDaePath(zipPath, newAnimationName):
+    """Returns the path prepareDaeAnimation converts the zip at zipPath to"""
+    zipName = getNameFromPath(zipPath)
+    daeName = zipName if len(newAnimationName) == 0 else newAnimationName
+    if DELETE_TEXTURES:
+        return abspath(f"{getFolderFromPath(zipPath)}/{daeName}.dae")
+    return abspath(f"{getFolderFromPath(zipPath)}/{zipName}/{daeName}.dae")
+
+def getCachedDaePath(cacheKey, daePath):
+    """Returns daePath if the zip with cacheKey was converted to it and it still exists unchanged"""
+    entry = conversionCache.get(cacheKey)
+    if entry is None or entry['daePath'] != daePath or not exist(daePath):
+        return None
+    if getFileHash(entry['daePath']) != entry['daeHash']:
+        return None
+    return entry['daePath']
+
+def convertAnimation(zipPath, newAnimationName):
+    """Converts one animation zip unless the cache shows it was already converted, catching any error so other zips still get converted.
+    Returns the zip's result and new cache entry"""
+    result = {'zipPath': zipPath, 'daePath': None, 'error': None, 'isCached': False, 'cacheKey': None, 'cacheEntry': None}
+    try:
+        # The zip is hashed before converting since converting may delete it. The same zip converted
+        # into another folder, like another fighter's animations, is a different conversion
+        daePath = getConvertedDaePath(zipPath, newAnimationName)
+        result['cacheKey'] = f"{getFileHash(zipPath)}-{CONVERTER_VERSION}-{daePath}"
+        cachedDaePath = None if isForced else getCachedDaePath(result['cacheKey'], daePath)
+        if cachedDaePath is not None:
+            LOG(f"Skipping {zipPath} because it was already converted into {cachedDaePath}")
+            if DELETE_TEXTURES:
+                deleteAllFromPath(zipPath)
+            result['daePath'] = cachedDaePath
+            result['isCached'] = True
+            return result
+        result['daePath'] = prepareDaeAnimation(zipPath, newAnimationName)
+        result['cacheEntry'] = {'daePath': abspath(result['daePath']), 'daeHash': getFileHash(result['daePath'])}
+    except Exception as e:
+        LOGE(f"Failed to convert {zipPath}: {e}")
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+def convertAnimations(zipPaths, newAnimationName, jobCount, force = False):
+    """Converts the animation zips with up to jobCount processes, skipping the ones already converted unless force is True.
+    Returns their results in order and saves the new cache entries"""
+    cacheEntries = loadConversionCache(CONVERSION_CACHE_PATH)
+    if jobCount <= 1 or len(zipPaths) <= 1:
+        initConversionWorker(cacheEntries, force)
+        results = [convertAnimation(zipPath, newAnimationName) for zipPath in zipPaths]
+    else:
+        with ProcessPoolExecutor(max_workers=jobCount, initializer=initConversionWorker, initargs=(cacheEntries, force)) as executor:
+            results = list(executor.map(convertAnimation, zipPaths, [newAnimationName] * len(zipPaths)))
+    newCacheEntries = {result['cacheKey']: result['cacheEntry'] for result in results if result['cacheEntry'] is not None}
+    if newCacheEntries:
+        cacheEntries.update(newCacheEntries)
+        saveConversionCache(CONVERSION_CACHE_PATH, cacheEntries)
+    return results
+
+def logConversionReport(results):
+    """Logs every failed conversion and the totals. Returns the number of failures"""
+    failures = [result for result in results if result['error'] is not None]
+    cachedCount = len([result for result in results if result['isCached']])
+    for result in failures:
+        LOGE(f"FAILED {result['zipPath']}\n\t{result['error']}")
+    LOG(f"RESULT: Converted {len(results) - len(failures) - cachedCount} of {len(results)} animations. {cachedCount} were already converted and {len(failures)} failed")
+    return len(failures)
 
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Main #######################################################
 #----------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
     """
-    Must have ConvertToXcodeCollada in Desktop/StreamCodes/scripts/ConvertToXcodeCollada/ConvertToXcodeCollada.workflow
-
     Execute by
     1. If zip file is passed, unzip and convert into a usable .dae file
         python3 "mixamoAnimToXcode.py" <path_to_zip> <optional_new_name>
@@ -133,25 +233,26 @@ if __name__ == "__main__":
 
         a. If the folder's name is "animations", then the script will convert .zip files including subdirectories
         b. Any other names of a folder will not convert subdirectories
+    3. Pass --jobs <count> to convert that many zips at the same time (defaults to JOBS). A zip that fails
+        to convert is reported at the end without stopping the others
+    4. Zips whose converted .dae still exists unchanged where it would be written are skipped, even if it was renamed with a new name.
+        Pass --force to convert them again
     """
-    pathsToConvert, newAnimationName = validateAndGetInput()
+    pathsToConvert, newAnimationName, jobCount, force = validateAndGetInput()
+    zipPaths = []
     for pathToConvert in pathsToConvert:
         if isFolder(pathToConvert):
             if getNameFromPath(pathToConvert) == "Characters":
-                #Get all of the paths that contains "animations" folder and run the same thing as "animations" folders
-                animationsPaths = []
-                for root, dirs, files in os.walk(pathToConvert):
-                    for dir in dirs:
-                        if dir == "animations":
-                            animationsPath = os.path.join(root, dir)
-                            handleAnimationsFolder(animationsPath)
+                #Get the zips in every "animations" folder, listing each folder only once
+                zipPaths += getZipPaths(scanInventory(pathToConvert), isInAnimationsFolder=True)
             elif getNameFromPath(pathToConvert) == "animations":
-                handleAnimationsFolder(pathToConvert)
+                zipPaths += getZippedDaePaths(pathToConvert, includeSubfolders=True)
             else:
                 #Handle zipped files in current directory only
-                for filename in os.listdir(pathToConvert):
-                    filePath = os.path.join(pathToConvert, filename)
-                    handleZippedDae(filePath, newAnimationName)
-        else:
-            handleZippedDae(pathToConvert, newAnimationName)
+                zipPaths += getZippedDaePaths(pathToConvert)
+        elif getExtensionFromPath(pathToConvert) == ".zip":
+            zipPaths.append(pathToConvert)
+    results = convertAnimations(zipPaths, newAnimationName, jobCount, force)
+    if logConversionReport(results) > 0:
+        sys.exit(1)
     LOG(f"✅✅✅")
@@ -2,59 +2,114 @@
 # This will do the following
 # 1. Unzip files and properly rename its files and folders
 # 2. Update the .dae file's texture
-# 3. Run the ConvertToXcodeCollada script to the .dae files
+# 3. Convert the .dae files the same way the ConvertToXcodeCollada workflow does
 
+import json
 import os
+import re
 import shutil
-import subprocess
 import sys
+import time
 import zipfile
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from enum import Enum
 from os.path import abspath, expanduser
 
 from Logger import *
 
 try:
-    from subprocess import DEVNULL  # python3
+    from PIL import Image
 except ImportError:
-    DEVNULL = open(os.devnull, 'wb')
+    Image = None #Pillow is only needed to optimize textures
 
 #----------------------------------------------------------------------------------------------------------------
 ############################################### CUSTOMIZABLE SETTINGS ###########################################
 #----------------------------------------------------------------------------------------------------------------
 SHOULDUNZIP = True
+UNZIP_JOBS = min(8, os.cpu_count() or 1) #Threads extracting a character zip's textures at the same time
+TASK_JOBS = 8 #Conversion steps run at the same time across all fighters. Override with --jobs <count>
+OPTIMIZE_TEXTURES = False #Downscale and recompress every fighter's textures after renaming them. Requires Pillow
+TEXTURE_MAX_SIZES = {"Diffuse": 2048, "Normal": 1024, "Specular": 1024, "Glossiness": 1024} #Longest side in pixels of each texture map type
+TEXTURE_DEFAULT_MAX_SIZE = 2048 #Longest side in pixels of texture map types missing from TEXTURE_MAX_SIZES
+TEXTURE_POWER_OF_TWO = False #Round both sides of textures down to powers of two so the GPU can build mipmaps of them. Changes the aspect ratio of maps that are not square
+TEXTURE_JPEG_QUALITY = 90
+TEXTURE_JOBS = min(8, os.cpu_count() or 1) #Threads optimizing a fighter's textures at the same time
 
 USERDOWNLOADSFOLDER = abspath(expanduser("~/") + '/Downloads')
-WORKFLOWPATH_ConvertToXcodeCollada = abspath(expanduser("~/") + '/Desktop/StreamCodes/scripts/ConvertToXcodeCollada/ConvertToXcodeCollada.workflow')
+FIGHTERS_DATA_PATH = os.path.join(os.path.dirname(abspath(__file__)), "fighters.json") #Add a fighter by adding it to this file
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Objects ####################################################
 #----------------------------------------------------------------------------------------------------------------
 
 class Fighter:
-    def __init__(self, fighterType):
+    """A fighter from FIGHTERS_DATA_PATH with its Mixamo keys computed once"""
+    __slots__ = ('fighterType', 'folderName', 'mixamoName', 'name', 'hasMultipleTextureVersion', 'mixamoKey', 'textureName')
+
+    def __init__(self, fighterType, data):
         self.fighterType = fighterType
-        self.folderName = MIXAMO_FOLDERNAMES[fighterType]
-        self.mixamoName = MIXAMO_NAMES[fighterType]
-        self.textureName = getTextureKey(fighterType)
-        self.name = FIGHTER_NAMES[fighterType]
-
-class FighterType(Enum):
-    samuel = "samuel"
-    clara = "clara"
-    kim = "kim"
-    deeJay = "deejay"
-    jad = "jad"
-    # olivia = "olivia" #corrupted .dae
-    ruby = "ruby"
-    cain = "cain"
-    andrew = "andrew"
-    corey = "corey"
-    alexis = "alexis"
-    marco = "marco" #stopped using because his hair is not getting rendered properly on the back of his head
-    jennifer = "jennifer" #unused for now
-    neverRight = "neverRight"
-    eve = "eve" #the ".Gonzales" in zip file name's "Eve By J.Gonzales.zip" us causing the character's folder to be named as "Eve By J"
+        self.folderName = data['mixamoFolderName']
+        self.mixamoName = data['mixamoName']
+        self.name = data['name']
+        # Set to true if after downloading .dae zipped files, and the textures
+        # folder has 1001 and 1002 in the image names
+        self.hasMultipleTextureVersion = data.get('hasMultipleTextureVersion', False)
+        # The "Ch02" in "Ch02_nonPBR" or "Prisoner B Styperek"
+        self.mixamoKey = self.folderName[:4] if self.folderName.startswith("Ch") else self.folderName
+        # Something like either "Ch17_100" or "Ch03_1001" or "prisoner"
+        if 'textureKey' in data:
+            self.textureName = data['textureKey']
+        elif self.mixamoKey.startswith("Ch"):
+            self.textureName = self.mixamoKey + ("_100" if self.hasMultipleTextureVersion else "_1001")
+        else:
+            LOGE(f"This texture's key might be unexpected: {self.mixamoKey}")
+            self.textureName = self.mixamoKey
+
+class Task:
+    """A conversion step that runs once every task in dependencies has finished"""
+    def __init__(self, name, function, dependencies = None):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies or [])
+        self.duration = 0
+        self.error = None
+        self.isSkipped = False
+
+    def run(self):
+        startTime = time.perf_counter()
+        try:
+            self.function()
+        except Exception as e:
+            self.error = e
+            LOGE(f"Failed {self.name} with error: {e}")
+        self.duration = time.perf_counter() - startTime
+
+class InventoryKind(Enum):
+    characterZip = "character zip"
+    animationZip = "animation zip"
+    dae = ".dae"
+    texturesFolder = "textures folder"
+
+class InventoryItem:
+    """An entry found by scanInventory. depth is the number of folders between the scanned folder and the entry"""
+    __slots__ = ('kind', 'path', 'depth', 'fighterType', 'isInAnimationsFolder')
+
+    def __init__(self, kind, path, depth, fighterType, isInAnimationsFolder):
+        self.kind = kind
+        self.path = path
+        self.depth = depth
+        self.fighterType = fighterType #The fighter the entry belongs to, or None
+        self.isInAnimationsFolder = isInAnimationsFolder
+
+class Inventory:
+    """The entries of a folder found by scanInventory, so later steps never list the folder again"""
+    def __init__(self, rootPath):
+        self.rootPath = rootPath
+        self.items = []
+
+    def getItems(self, kind, isInAnimationsFolder = None):
+        """Returns the items of kind in the order they were found, optionally only the ones in or out of an animations folder"""
+        return [item for item in self.items if item.kind == kind and (isInAnimationsFolder is None or item.isInAnimationsFolder == isInAnimationsFolder)]
 
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Constants ##################################################
@@ -62,80 +117,34 @@ class FighterType(Enum):
 
 ANIMATION_CATEGORIES = ["dodge", "hit", "idle", "kick", "kill", "punch", "others"]
 
+# Patterns of the sed script in ConvertToXcodeCollada.workflow, which merges every animation into one
+ANIMATION_ID_PATTERN = re.compile(rb'<animation id.*>')
+ANIMATION_END_TAG = b'</animation>'
+LIBRARY_ANIMATIONS_END_TAG = b'</library_animations>'
+# Bytes read at a time when rewriting a .dae, so memory use does not grow with the model's size
+DAE_CHUNK_SIZE = 1024 * 1024
+TEXTURE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+TEXTURE_MAX_SIZES_BY_MAP_TYPE = {mapType.lower(): maxSize for (mapType, maxSize) in TEXTURE_MAX_SIZES.items()}
+
+def loadFightersData(dataPath):
+    """Returns the data of every enabled fighter in the json file at dataPath"""
+    with open(dataPath, 'r') as file:
+        return [data for data in json.load(file)['fighters'] if data.get('isEnabled', True)]
+
+FIGHTERS_DATA = loadFightersData(FIGHTERS_DATA_PATH)
+FighterType = Enum('FighterType', [(data['type'], data['value']) for data in FIGHTERS_DATA])
+FIGHTERS = {FighterType[data['type']]: Fighter(FighterType[data['type']], data) for data in FIGHTERS_DATA}
+
 #Can get after downloading the .dae zipped files
-MIXAMO_FOLDERNAMES = {
-    FighterType.samuel: "samuel", 
-    FighterType.clara: "clara",
-    FighterType.kim: "Ch02_nonPBR",
-    FighterType.deeJay: "Ch03_nonPBR",
-    FighterType.jad: "Ch08_nonPBR",
-    # FighterType.olivia: "Ch11_nonPBR",
-    FighterType.ruby: "Ch13_nonPBR",
-    FighterType.cain: "Ch16_nonPBR",
-    FighterType.andrew: "Ch17_nonPBR",
-    FighterType.corey: "Ch28_nonPBR",
-    FighterType.alexis: "Ch37_nonPBR",
-    FighterType.marco: "Ch42_nonPBR",
-    FighterType.jennifer: "Ch47_nonPBR",
-    FighterType.neverRight: "Prisoner B Styperek",
-    FighterType.eve: "Eve By J.Gonzales",
-}
-
-MIXAMO_NAMES = {
-    FighterType.samuel: "fiverr-samuel",
-    FighterType.clara: "fiverr-clara",
-    FighterType.kim: "Sophie",
-    FighterType.deeJay: "Michelle",
-    FighterType.jad: "Adam",
-    # FighterType.olivia: "Olivia",
-    FighterType.ruby: "Roth",
-    FighterType.alexis: "Jody",
-    FighterType.cain: "Chad",
-    FighterType.andrew: "Pete",
-    FighterType.corey: "David",
-    FighterType.marco: "Bryce",
-    FighterType.jennifer: "Jennifer",
-    FighterType.neverRight: "Prisoner B Styperek",
-    FighterType.eve: "Eve By J.Gonzales",
-}
-
-FIGHTER_NAMES = {
-    FighterType.samuel: "Samuel",
-    FighterType.clara: "Clara",
-    FighterType.kim: "Kim",
-    FighterType.deeJay: "Dee Jay",
-    FighterType.jad: "Jad",
-    # FighterType.olivia: "Olivia",
-    FighterType.ruby: "Ruby",
-    FighterType.cain: "Cain",
-    FighterType.andrew: "Andrew",
-    FighterType.corey: "Corey",
-    FighterType.alexis: "Alexis",
-    FighterType.marco: "Marco",
-    FighterType.jennifer: "Jennifer",
-    FighterType.neverRight: "Never Right",
-    FighterType.eve: "Eve",
-}
-
-# Set to true if after downloading .dae zipped files, and the textures 
-# folder has 1001 and 1002 in the image names
-MIXAMO_HAS_MULTIPLE_TEXTURE_VERSION = {
-    FighterType.samuel: False,
-    FighterType.clara: False,
-    FighterType.kim: True,
-    FighterType.deeJay: False,
-    FighterType.jad: True,
-    # FighterType.olivia: True,
-    FighterType.ruby: True,
-    FighterType.cain: True,
-    FighterType.andrew: True,
-    FighterType.corey: False,
-    FighterType.alexis: True,
-    FighterType.marco: True,
-    FighterType.jennifer: True,
-    FighterType.neverRight: False,
-    FighterType.eve: False,
-}
+MIXAMO_FOLDERNAMES = {fighterType: fighter.folderName for (fighterType, fighter) in FIGHTERS.items()}
+MIXAMO_NAMES = {fighterType: fighter.mixamoName for (fighterType, fighter) in FIGHTERS.items()}
+FIGHTER_NAMES = {fighterType: fighter.name for (fighterType, fighter) in FIGHTERS.items()}
+MIXAMO_HAS_MULTIPLE_TEXTURE_VERSION = {fighterType: fighter.hasMultipleTextureVersion for (fighterType, fighter) in FIGHTERS.items()}
+
+# Matches the Mixamo folder name a file or folder name starts with, trying longer names first so the longest one wins
+FIGHTER_TYPES_BY_FOLDERNAME = {fighter.folderName: fighterType for (fighterType, fighter) in FIGHTERS.items()}
+FIGHTER_TYPES_BY_NAME = {fighter.name: fighterType for (fighterType, fighter) in FIGHTERS.items()}
+FOLDERNAME_PREFIX_PATTERN = re.compile("|".join(re.escape(folderName) for folderName in sorted(FIGHTER_TYPES_BY_FOLDERNAME, key=len, reverse=True)))
 
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Helper Methods #############################################
@@ -181,6 +190,45 @@ def deleteAllFromPath(path):
         except Exception as e:
             LOGE('Failed to delete %s. Reason: %s' % (path, e))
 
+def getTempPath(path):
+    """Returns a hidden temp path next to path, to write to before atomically replacing path"""
+    return f"{getFolderFromPath(path)}/.{getNameFromPath(path, withExtension=True)}.tmp"
+
+def replaceInFile(path, oldText, newText):
+    """Replaces every oldText in the file like str.replace, one chunk at a time, and atomically replaces the file.
+    Returns the number of replacements"""
+    oldBytes = oldText.encode()
+    newBytes = newText.encode()
+    overlapSize = len(oldBytes) - 1 #Bytes kept between chunks in case a match starts in them
+    replacementCount = 0
+    tempPath = getTempPath(path)
+    try:
+        with open(path, 'rb') as file, open(tempPath, 'wb') as tempFile:
+            pending = b''
+            while True:
+                chunk = file.read(DAE_CHUNK_SIZE)
+                data = pending + chunk
+                position = 0
+                while True:
+                    matchIndex = data.find(oldBytes, position)
+                    if matchIndex == -1:
+                        break
+                    tempFile.write(data[position:matchIndex])
+                    tempFile.write(newBytes)
+                    position = matchIndex + len(oldBytes)
+                    replacementCount += 1
+                if not chunk:
+                    tempFile.write(data[position:])
+                    break
+                keepIndex = max(position, len(data) - overlapSize)
+                tempFile.write(data[position:keepIndex])
+                pending = data[keepIndex:]
+        os.replace(tempPath, path)
+    except OSError:
+        deleteAllFromPath(tempPath)
+        raise
+    return replacementCount
+
 def renamePath(path, newPath):
     if exist(newPath):
         deleteAllFromPath(newPath)
@@ -188,61 +236,25 @@ def renamePath(path, newPath):
     shutil.move(path, newPath) #fails if newPath already exist
 
 def getMixamoKey(fighterType):
-    # Returns the "Ch02" in "Ch02_nonPBR" or "Prisoner B Styperek"
-    mixamoKey = MIXAMO_FOLDERNAMES[fighterType]
-    if mixamoKey.startswith("Ch"):
-        # If fighter's folder name contains Ch, then 
-        # its key is the first 4 characters e.g. Ch02
-        mixamoKey = mixamoKey[:4]
-    LOGA(f"Mixamo key for {fighterType.value} is {mixamoKey}")
-    return mixamoKey
+    """Returns the "Ch02" in "Ch02_nonPBR" or "Prisoner B Styperek\""""
+    return FIGHTERS[fighterType].mixamoKey
 
 def getTextureKey(fighterType):
     """Returns something like either "Ch17_100" or "Ch03_1001" or "prisoner\""""
-    textureName = getMixamoKey(fighterType)
-    hasMultipleVersion = MIXAMO_HAS_MULTIPLE_TEXTURE_VERSION[fighterType]
-    if not textureName.startswith("Ch"):
-        if fighterType == FighterType.samuel:
-            textureName = FighterType.samuel.value
-        elif fighterType == FighterType.clara:
-            textureName = FighterType.clara.value
-        elif fighterType == FighterType.neverRight:
-            textureName = "prisoner"
-        elif fighterType == FighterType.eve:
-            textureName = "SpacePirate"
-        else:
-            LOGE(f"This texture's key might be unexpected: {textureName}")
-    else:
-        if hasMultipleVersion:
-            textureName += "_100"
-        else:
-            textureName += "_1001"
-    return textureName
+    return FIGHTERS[fighterType].textureName
 
 def getTextureOldName(fighterType, filePath):
-    """Returns something like "Ch17_1002_Normal.png\""""
-    textureName = getMixamoKey(fighterType)
-    folderPath = getFolderFromPath(filePath)
-    hasMultipleVersion = MIXAMO_HAS_MULTIPLE_TEXTURE_VERSION[fighterType]
-    LOGD(f"texture name is {textureName} at {filePath}")
-    if not textureName.startswith("Ch"):
-        if fighterType == FighterType.samuel:
-            textureName = FighterType.samuel.value
-        elif fighterType == FighterType.clara:
-            textureName = FighterType.clara.value
-        elif fighterType == FighterType.neverRight:
-            textureName = "prisoner"
-        elif fighterType == FighterType.eve:
-            textureName = "SpacePirate"
-    else:
-        if hasMultipleVersion:
-            textureName += "_100"
-        else:
-            textureName += "_1001"
+    """Returns something like "Ch17_100\""""
+    return getTextureKey(fighterType)
 
-    fighter = Fighter(fighterType)
-    LOGA(f"Texture's OLD name for {fighter.name} from {filePath} IS {textureName}")
-    return textureName
+def getFighterType(fileName):
+    """Returns the type of the fighter whose Mixamo folder name fileName starts with, or None"""
+    match = FOLDERNAME_PREFIX_PATTERN.match(fileName)
+    return FIGHTER_TYPES_BY_FOLDERNAME[match.group(0)] if match else None
+
+def getOwningFighterType(folderName):
+    """Returns the type of the fighter a folder belongs to from its Mixamo folder name or its converted name, or None"""
+    return getFighterType(folderName) or FIGHTER_TYPES_BY_NAME.get(folderName)
 
 def getTextureNewName(fighterType, filePath):
     """Returns something like "kimTexture2_Diffuse.png\""""
@@ -258,10 +270,25 @@ def check_path_contains_files_with_type(path, file_type):
             return True
     return False
 
-def unzipFile(path, isAnimation = False):
-    """Unzips the path provided. 
+def isExtractableMember(zipInfo, onlyDae = False):
+    """Returns True if the zip member should be extracted. Skips macOS resource forks in __MACOSX,
+    and everything except .dae files if onlyDae is True"""
+    if "__MACOSX" in zipInfo.filename.split("/"):
+        return False
+    if onlyDae:
+        return not zipInfo.is_dir() and getExtensionFromPath(zipInfo.filename).lower() == ".dae"
+    return True
+
+def extractMembers(path, members, destinationPath):
+    """Extracts members of the zip at path with its own ZipFile, so threads never share one"""
+    with zipfile.ZipFile(path, 'r') as zip_ref:
+        for member in members:
+            zip_ref.extract(member, destinationPath)
+
+def unzipFile(path, isAnimation = False, onlyDae = False):
+    """Unzips the path provided and returns the destination path and the paths of the .dae files extracted directly in it.
     Set isAnimation to True if zip file is an animation because animations requires different
-    handling based on number of files"""
+    handling based on number of files. Set onlyDae to True to only extract the .dae files"""
     with zipfile.ZipFile(path, 'r') as zip_ref:
         daeFolderName = getFolderFromPath(path)
         zipName = getNameFromPath(path)
@@ -272,203 +299,416 @@ def unzipFile(path, isAnimation = False):
             LOGA(f"Fighter's folder already exist. Deleting old folder {unzippedPath}")
         destinationPath = ""
         if isAnimation:
-            # if len(zip_ref.namelist()) > 2: #>2 to ignore weird file: '__MACOSX/._medium.dae 
-            #     # LOG(f"RESULT1 Zip file has multiple files {daeFolderName}/{zipName}")
-            #     destinationPath = f"{daeFolderName}/{zipName}"
-            #     # LOGD(f"The stuff are {zip_ref.namelist()}")
-            # else:
-            #     # LOGA(f"RESULT2 Zip file only has 1 valid file at: {daeFolderName}")
-            #     destinationPath = daeFolderName
             destinationPath = f"{daeFolderName}/{zipName}"
             LOGA(f"Unzipping animation file from {path} TO {destinationPath}")
-            # for zipinfo in zip_ref.infolist():
-            #     # This will do the renaming
-            #     # LOGD(f"Unzipping {zipinfo.filename} AND {getExtensionFromPath(zipinfo.filename)}")
-            #     if zipinfo.is_dir and getExtensionFromPath(zipinfo.filename) == ".dae":
-            #         if not "__MACOSX" in zipinfo.filename:
-            #             newFileName = f"{zipName}.dae"
-            #             file_name = os.path.join(daeFolderName, zipinfo.filename)
-            #             LOGD(f"CHANGING NAME from {zipinfo.filename} TO {newFileName} \t\t\t {file_name}")
-            #             zipinfo.filename = newFileName
-            #             # zip_ref.extract(zipinfo)
-            #             zip_ref.extract(file_name)
-            #             LOGD(f"CHANGED NAME EXTRACTED {zipinfo.filename}")
         else:
             destinationPath = unzippedPath
+        members = [member for member in zip_ref.infolist() if isExtractableMember(member, onlyDae)]
 
-        zip_ref.extractall(destinationPath)
-        LOGA(f"DONE Unzipping file from {path} to \t\t {destinationPath}")
-        return destinationPath
+    folderMembers = [member for member in members if member.is_dir()]
+    fileMembers = [member for member in members if not member.is_dir()]
+    if isAnimation or UNZIP_JOBS <= 1 or len(fileMembers) <= 1:
+        extractMembers(path, members, destinationPath)
+    else:
+        #Create every folder first so threads never race to create the same one
+        extractMembers(path, folderMembers, destinationPath)
+        for member in fileMembers:
+            memberFolder = os.path.dirname(member.filename)
+            if memberFolder and not os.path.isabs(memberFolder) and ".." not in memberFolder.split("/"):
+                os.makedirs(os.path.join(destinationPath, memberFolder), exist_ok=True)
+        #Deal the largest textures out first so every thread gets a similar amount to decompress
+        fileMembers.sort(key=lambda member: member.file_size, reverse=True)
+        memberGroups = [fileMembers[index::UNZIP_JOBS] for index in range(UNZIP_JOBS)]
+        with ThreadPoolExecutor(max_workers=UNZIP_JOBS) as executor:
+            list(executor.map(lambda memberGroup: extractMembers(path, memberGroup, destinationPath), memberGroups))
+    LOGA(f"DONE Unzipping {len(fileMembers)} files from {path} to \t\t {destinationPath}")
+    daePaths = [os.path.join(destinationPath, member.filename) for member in fileMembers
+                if "/" not in member.filename and getExtensionFromPath(member.filename).lower() == ".dae"]
+    return destinationPath, daePaths
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Methods ####################################################
 #----------------------------------------------------------------------------------------------------------------
 # Validates inputs and returns the path to convert
 def getPathToConvert():
-    userPath = expanduser("~/")
+    """Returns the path to convert and the number of jobs"""
+    arguments = sys.argv[1:]
+    jobCount = TASK_JOBS
+    if "--jobs" in arguments:
+        index = arguments.index("--jobs")
+        if index + 1 >= len(arguments) or not arguments[index + 1].isdigit() or int(arguments[index + 1]) < 1:
+            LOGE("Error Usage: --jobs must be followed by a number of jobs of at least 1")
+            sys.exit(1)
+        jobCount = int(arguments[index + 1])
+        del arguments[index:index + 2]
     # Defaults to converting user's Downloads folder if path is not provided
     pathToConvert = ""
-    if len(sys.argv) == 2:
-        pathToConvert = sys.argv[1]
-    if len(sys.argv) == 1:
+    if len(arguments) == 1:
+        pathToConvert = arguments[0]
+    elif len(arguments) == 0:
         pathToConvert = USERDOWNLOADSFOLDER
     else:
-        LOGE("Error Usage: python mixamoToXcode.py <optional_directory_path>")
+        LOGE("Error Usage: python3 mixamoCharactersToXcode.py [--jobs <count>] <optional_directory_path>")
         LOGW("""WARNING: Executing this script will default to converting files downloaded in 
               your Downloads folder if a path is not provided""")
         sys.exit(1)
-    return pathToConvert
-
-def getFighterPaths(fromPath):
+    return pathToConvert, jobCount
+
+def scanInventory(path, maxDepth = None, onlyFighterFolders = False):
+    """Lists path and its subfolders exactly once with os.scandir and returns an Inventory of their character zips,
+    animation zips, .dae files and textures folders. Folders deeper than maxDepth are not listed, and neither are
+    folders that do not belong to a fighter if onlyFighterFolders is True"""
+    inventory = Inventory(path)
+    foldersToScan = [(path, 0, None, getNameFromPath(path, withExtension=True) == "animations")]
+    while foldersToScan:
+        folderPath, depth, fighterType, isInAnimationsFolder = foldersToScan.pop()
+        with os.scandir(folderPath) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        subfolders = []
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name == "textures":
+                    inventory.items.append(InventoryItem(InventoryKind.texturesFolder, entry.path, depth, fighterType, isInAnimationsFolder))
+                subfolderFighterType = getOwningFighterType(entry.name) or fighterType
+                #Like os.walk, never follow links to folders so a link cannot make the scan loop
+                if entry.is_symlink() or (maxDepth is not None and depth >= maxDepth) or (onlyFighterFolders and subfolderFighterType is None):
+                    continue
+                subfolders.append((entry.path, depth + 1, subfolderFighterType, isInAnimationsFolder or entry.name == "animations"))
+            elif entry.name.endswith(".zip"):
+                #Zips in an animations folder are always animations, even if named after a fighter
+                zipFighterType = None if isInAnimationsFolder else getFighterType(entry.name)
+                kind = InventoryKind.animationZip if zipFighterType is None else InventoryKind.characterZip
+                inventory.items.append(InventoryItem(kind, entry.path, depth, zipFighterType or fighterType, isInAnimationsFolder))
+            elif entry.name.endswith(".dae"):
+                inventory.items.append(InventoryItem(InventoryKind.dae, entry.path, depth, fighterType, isInAnimationsFolder))
+        #Scan subfolders in order, after the files of their parent folder like os.walk
+        foldersToScan += reversed(subfolders)
+    return inventory
+
+def getFighterPaths(fromPath, inventory = None):
+    """Returns the path and .dae paths of every fighter's folder in fromPath that contains a .dae file, unzipping the
+    character zips first if SHOULDUNZIP is True. Pass inventory if fromPath was already scanned with scanInventory"""
+    if inventory is None:
+        inventory = scanInventory(fromPath, maxDepth=1, onlyFighterFolders=True)
+    daePathsByFolder = {}
+    for item in inventory.getItems(InventoryKind.dae):
+        #Only folders directly in fromPath that are named after a fighter's Mixamo folder name
+        if item.depth == 1:
+            daePathsByFolder.setdefault(getFolderFromPath(item.path), []).append(item.path)
     fighterPathsDic = {}
-    # Iterate over files in directory
-    for filePath in os.scandir(fromPath):
-        fileName = os.path.basename(filePath)
-        fullPath = os.path.join(fromPath, filePath)
-        #if path is a folder and contains a .dae file...
-        if os.path.isdir(filePath):
-            if check_path_contains_files_with_type(fullPath, ".dae"):
-                for fighterType, mixamoFolderName in MIXAMO_FOLDERNAMES.items():
-                    if fileName.startswith(mixamoFolderName):
-                        fighterPathsDic[fighterType] = fullPath
-        else:
-            if SHOULDUNZIP:
-                #Handle expected zipped file names. Else skip
-                for fighterType, mixamoFolderName in MIXAMO_FOLDERNAMES.items():
-                    if fileName.startswith(mixamoFolderName):
-                        if fullPath.endswith(".zip"):
-                            LOGA(f"Unzipping file at {fullPath}")
-                            unzipFile(fullPath)
-                            #Add path to the new unzipped file
-                            unzippedPath = f"{getFolderFromPath(fullPath)}/{getNameFromPath(fullPath)}"
-                            if check_path_contains_files_with_type(unzippedPath, ".dae"):
-                                fighterPathsDic[fighterType] = unzippedPath
+    for (folderPath, daePaths) in daePathsByFolder.items():
+        fighterType = getFighterType(getNameFromPath(folderPath, withExtension=True))
+        if fighterType is not None:
+            fighterPathsDic[fighterType] = (folderPath, daePaths)
+    if SHOULDUNZIP:
+        #Handle expected zipped file names. Else skip
+        for item in inventory.getItems(InventoryKind.characterZip):
+            if item.depth != 0:
+                continue
+            LOGA(f"Unzipping file at {item.path}")
+            unzippedPath, daePaths = unzipFile(item.path)
+            #Add path to the new unzipped file
+            if daePaths:
+                fighterPathsDic[item.fighterType] = (unzippedPath, daePaths)
     return fighterPathsDic
 
 def updateDaeFile(fighterType, daePath):
     """
-    Update the fighter's .dae to the renamed textures
+    Update the fighter's .dae to the renamed textures and returns the number of replacements
     """
     if not exist(daePath):
-        return
-    fighter = Fighter(fighterType)
-    # Read in the file
-    with open(daePath, 'r') as file:
-        filedata = file.read()
-        # Replace the target string
-        textToReplace = f"textures/{getTextureKey(fighter.fighterType)}"
-        filedata = filedata.replace(textToReplace, f"assets/{fighterType.value}Texture")
-        # Write the file out again
-        with open(daePath, 'w') as file:
-            file.write(filedata)
-            LOGA(f"Finished updating dae file in {daePath}. Replacing all contents from {textToReplace} into {fighterType.value}Texture")
-
-def executeConvertToXcodeColladaWorkflow(daePath):
-    """Executes ConvertXcodeCollada workflow and to the dae path, then deletes the unneeded .dae file"""
-    if not exist(WORKFLOWPATH_ConvertToXcodeCollada):
-        LOGE(f"File missing for ConvertToXcodeCollada {WORKFLOWPATH_ConvertToXcodeCollada}")
+        return 0
+    fighter = FIGHTERS[fighterType]
+    # Replace the target string without reading the whole file into memory
+    textToReplace = f"textures/{getTextureKey(fighter.fighterType)}"
+    replacementCount = replaceInFile(daePath, textToReplace, f"assets/{fighterType.value}Texture")
+    LOGA(f"Finished updating dae file in {daePath}. Replaced {replacementCount} contents from {textToReplace} into {fighterType.value}Texture")
+    return replacementCount
+
+def convertLineToXcodeCollada(line, isBeforeFirstAnimation):
+    """Returns the lines to write for a line of a .dae, doing what each command of the workflow's sed script does to it"""
+    if isBeforeFirstAnimation:
+        #1,/<animation id.*>/s/<animation id.*>/<animation>/
+        line = ANIMATION_ID_PATTERN.sub(b'<animation>', line, count=1)
+    if ANIMATION_ID_PATTERN.search(line) or ANIMATION_END_TAG in line:
+        #/<animation id.*>/d;/<\/animation>/d
+        return []
+    if LIBRARY_ANIMATIONS_END_TAG in line:
+        #/<\/library_animations>/s/<\/library_animations>/<\/animation>/;/<\/animation>/a\ </library_animations>
+        line = line.replace(LIBRARY_ANIMATIONS_END_TAG, ANIMATION_END_TAG, 1)
+        if not line.endswith(b'\n'):
+            line += b'\n'
+        return [line, LIBRARY_ANIMATIONS_END_TAG + b'\n']
+    return [line]
+
+def convertToXcodeCollada(daePath):
+    """Merges every animation of the .dae into one like the ConvertToXcodeCollada workflow, one line at a time,
+    and atomically replaces the .dae. Returns the number of animations merged"""
     if not exist(daePath):
         LOGE(f"File missing for dae to convert {daePath}")
+        return 0
+    animationCount = 0
+    isBeforeFirstAnimation = True
+    tempPath = getTempPath(daePath)
     try:
-        # Execute the workflow
-        proc = subprocess.check_output(["/usr/bin/automator", "-i", daePath, WORKFLOWPATH_ConvertToXcodeCollada],                                
-                                        stderr=DEVNULL)
-        #Remove unneeded .dae file the workflow generated
-        uneededDaeFileName = f"{getNameFromPath(daePath, withExtension=True)}-e"
-        uneededDaePath = f"{getFolderFromPath(daePath)}/{uneededDaeFileName}"
-        os.remove(uneededDaePath)
-        LOGA(f"Executed ConvertToXcodeCollada to daePath: {daePath} and deleted {uneededDaeFileName}")
-    except subprocess.CalledProcessError as e:
-        LOGE(f"Failed to execute script at path: {daePath}\n\tWith error code: {e.returncode} \tand output: {e.output}")
-        # LOGE('Python Error executing ConvertToXcodeCollada workflow with error: [%d]\n{!r}'.format(e.returncode, e.output))
-        sys.exit(1)
-
-def updateFighters(fighterType, fighterPath):
-    """
-    1. Update the .dae's name in fighterPath
-    2. Update the textures folder to assets in fighterPath
-    3. Create an animations folder and more folders for each categories
-    4. Update the name of the .png files in fighterPath/assets
-    5. Rename the root fighter's path to its name
-    6. Delete old fighterPath
-    7. Update .dae file's contents to still point to the updated assets
-    8. Run the script ConvertToXcodeCollada on the .dae file
-    """
-    LOGA(f"Updating fighterType: {fighterType.value}")
-
-    if not os.path.isdir(fighterPath) or not check_path_contains_files_with_type(fighterPath, ".dae"):
-        LOGE(f"Path is invalid: {fighterPath}")
-        return
-    fighter = Fighter(fighterType)
-    newDaeFilePath = None
-    for filePath in os.scandir(fighterPath):
-        fileName = os.path.basename(filePath)
-        fullPath = os.path.join(fighterPath, filePath)
-        if fileName.endswith(".dae"):
-            #1. Update the .dae's name
-            daePath = f"{fighterPath}/{fileName}"
-            newDaeFilePath = f"{fighterPath}/{fighter.fighterType.value}.dae"
-            renamePath(daePath, newDaeFilePath)
-            LOGA(f"Renamed .dae file from {fileName} to {fighter.fighterType.value}.dae")
-        elif fileName == "textures":
-            #2. Update the textures folder to assets
-            newFolderName = os.path.join(fighterPath, "assets")
-            renamePath(fullPath, newFolderName)
-            LOGA(f"Renamed textures to assets {fullPath}")
-    
-    #3. Create an animations folder and more folders for each categories
+        with open(daePath, 'rb') as daeFile, open(tempPath, 'wb') as tempFile:
+            for (lineNumber, line) in enumerate(daeFile, start=1):
+                isAnimation = ANIMATION_ID_PATTERN.search(line) is not None
+                tempFile.writelines(convertLineToXcodeCollada(line, isBeforeFirstAnimation))
+                if isAnimation:
+                    animationCount += 1
+                    # Like sed's 1,/regex/ range, which ends at the first match after line 1
+                    if lineNumber > 1:
+                        isBeforeFirstAnimation = False
+        os.replace(tempPath, daePath)
+    except OSError as e:
+        deleteAllFromPath(tempPath)
+        LOGE(f"Failed to convert {daePath} to Xcode Collada with error: {e}")
+        raise
+    LOGA(f"Converted {daePath} to Xcode Collada by merging {animationCount} animations")
+    return animationCount
+
+def renameDaeFile(fighter, fighterPath, daePaths = None):
+    """1. Update the .dae's name in fighterPath. Lists fighterPath for its .dae files unless daePaths is provided"""
+    if daePaths is None:
+        daePaths = [entry.path for entry in os.scandir(fighterPath) if entry.name.endswith(".dae")]
+    for daePath in daePaths:
+        fileName = os.path.basename(daePath)
+        newDaeFilePath = f"{fighterPath}/{fighter.fighterType.value}.dae"
+        renamePath(daePath, newDaeFilePath)
+        LOGA(f"Renamed .dae file from {fileName} to {fighter.fighterType.value}.dae")
+
+def renameTexturesFolder(fighterPath):
+    """2. Update the textures folder to assets in fighterPath"""
+    texturesPath = os.path.join(fighterPath, "textures")
+    if exist(texturesPath):
+        renamePath(texturesPath, os.path.join(fighterPath, "assets"))
+        LOGA(f"Renamed textures to assets {texturesPath}")
+
+def createAnimationsFolders(fighterPath):
+    """3. Create an animations folder and more folders for each categories"""
     animationsPath = f"{fighterPath}/animations"
     createFolder(animationsPath)
     for categories in ANIMATION_CATEGORIES:
         createFolder(f"{animationsPath}/{categories}")
 
-    #4. Update the name of the .png files in assets
+def renameTextures(fighter, fighterPath):
+    """4. Update the name of the .png files in fighterPath/assets"""
     assetsPath = f"{fighterPath}/assets"
     if exist(assetsPath):
         for filePath in os.scandir(assetsPath):
             fullPath = os.path.join(fighterPath, filePath)
-            newName = getTextureNewName(fighterType, filePath)
+            newName = getTextureNewName(fighter.fighterType, filePath)
             newPath = f"{assetsPath}/{newName}"
             renamePath(fullPath, newPath)
             LOGA(f"Finished renaming image from {fullPath} to {newPath}")
     else:
-        print(f"TODO: Handle or manually convert assets for fighter: {fighterType.value}")
+        print(f"TODO: Handle or manually convert assets for fighter: {fighter.fighterType.value}")
+
+def moveDaeToAssets(daePath):
+    """8.5 Move .dae inside assets folder"""
+    if exist(daePath):
+        LOGD("Moving .dae character to assets folder")
+        daeInAssetsPath = f"{getFolderFromPath(daePath)}/assets/{getNameFromPath(daePath, withExtension=True)}"
+        moveFile(daePath, daeInAssetsPath)
 
-    #5. Rename the root fighter's path to its name
+def getTextureMaxSize(texturePath):
+    """Returns the longest side allowed for a texture from its map type, like "Normal" in "kimTexture_Normal.png\""""
+    mapType = getNameFromPath(texturePath).rsplit("_", 1)[-1].lower()
+    return TEXTURE_MAX_SIZES_BY_MAP_TYPE.get(mapType, TEXTURE_DEFAULT_MAX_SIZE)
+
+def getOptimizedTextureSize(size, maxSize):
+    """Returns size scaled down to fit in maxSize, keeping its aspect ratio. If TEXTURE_POWER_OF_TWO is True, each side
+    is then rounded down to a power of two, so textures never grow but maps that are not square change aspect ratio"""
+    scale = min(1, maxSize / max(size))
+    width, height = (max(1, round(length * scale)) for length in size)
+    if TEXTURE_POWER_OF_TWO:
+        width, height = 1 << (width.bit_length() - 1), 1 << (height.bit_length() - 1)
+    return width, height
+
+def saveTexture(image, path, imageFormat):
+    """Saves image to path compressed as small as its format allows without losing quality"""
+    options = {'optimize': True}
+    if imageFormat == "JPEG":
+        options['quality'] = TEXTURE_JPEG_QUALITY
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    image.save(path, format=imageFormat, **options)
+
+def optimizeTexture(texturePath):
+    """Downscales and recompresses the texture at texturePath in place, catching any error so the other textures still get optimized.
+    Returns its size in pixels and bytes before and after"""
+    result = {'path': texturePath, 'oldSize': None, 'newSize': None, 'oldBytes': os.path.getsize(texturePath), 'newBytes': None, 'error': None}
+    tempPath = getTempPath(texturePath)
+    try:
+        with Image.open(texturePath) as image:
+            result['oldSize'] = image.size
+            result['newSize'] = getOptimizedTextureSize(image.size, getTextureMaxSize(texturePath))
+            if result['newSize'] == image.size:
+                saveTexture(image, tempPath, image.format)
+            else:
+                resizedImage = image.resize(result['newSize'], Image.LANCZOS)
+                resizedImage.info = image.info
+                saveTexture(resizedImage, tempPath, image.format)
+        #Only keep a recompressed texture of the same size if it is smaller
+        if result['newSize'] == result['oldSize'] and os.path.getsize(tempPath) >= result['oldBytes']:
+            os.remove(tempPath)
+        else:
+            os.replace(tempPath, texturePath)
+        result['newBytes'] = os.path.getsize(texturePath)
+    except Exception as e:
+        deleteAllFromPath(tempPath)
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+def logTextureReport(fighter, results):
+    """Logs every texture's size before and after optimizing it, and the totals"""
+    megabyte = 1024 * 1024
+    for result in results:
+        textureName = getNameFromPath(result['path'], withExtension=True)
+        if result['error'] is not None:
+            LOGE(f"FAILED optimizing {textureName}, keeping it unchanged: {result['error']}")
+            continue
+        (oldWidth, oldHeight), (newWidth, newHeight) = result['oldSize'], result['newSize']
+        LOG(f"\t{textureName}: {oldWidth}x{oldHeight} {result['oldBytes'] / megabyte:.2f}MB -> {newWidth}x{newHeight} {result['newBytes'] / megabyte:.2f}MB")
+    optimizedResults = [result for result in results if result['error'] is None]
+    oldBytes = sum(result['oldBytes'] for result in optimizedResults)
+    newBytes = sum(result['newBytes'] for result in optimizedResults)
+    #Textures are uncompressed RGBA on the GPU, and their mipmaps add another third
+    oldMemory = sum(width * height * 4 * 4 / 3 for (width, height) in (result['oldSize'] for result in optimizedResults))
+    newMemory = sum(width * height * 4 * 4 / 3 for (width, height) in (result['newSize'] for result in optimizedResults))
+    LOG(f"RESULT: Optimized {len(optimizedResults)} of {len(results)} textures of {fighter.name} from {oldBytes / megabyte:.2f}MB to {newBytes / megabyte:.2f}MB, and about {oldMemory / megabyte:.0f}MB to {newMemory / megabyte:.0f}MB of texture memory")
+
+def optimizeTextures(fighter, fighterPath):
+    """4.5 Downscale and recompress the textures in fighterPath/assets, keeping their names so the .dae still points to them"""
+    assetsPath = f"{fighterPath}/assets"
+    if not exist(assetsPath):
+        return []
+    with os.scandir(assetsPath) as entries:
+        texturePaths = [entry.path for entry in entries if entry.is_file() and getExtensionFromPath(entry.name).lower() in TEXTURE_EXTENSIONS]
+    with ThreadPoolExecutor(max_workers=TEXTURE_JOBS) as executor:
+        results = list(executor.map(optimizeTexture, texturePaths))
+    logTextureReport(fighter, results)
+    return results
+
+def renameFighterFolder(fighter, fighterPath):
+    """5. Rename the root fighter's path to its name and 6. Delete old fighterPath"""
     pathName = getNameFromPath(fighterPath)
     pathDir = getFolderFromPath(fighterPath)
     newName = pathName.replace(fighter.folderName, fighter.name)
     newFighterPath = f"{pathDir}/{newName}"
     renamePath(fighterPath, newFighterPath)
-
-    #6. Delete old fighterPath
     deleteAllFromPath(fighterPath)
+    LOGA(f"Finished converting fighter in path {fighterPath} to {newFighterPath}")
 
-    #7. Update .dae's file content to correct texture
-    daePath = os.path.join(newFighterPath, f"{fighterType.value}.dae")
-    updateDaeFile(fighterType, daePath)
-
-    #8. Execute ConvertXcodeCollada and delete the unneeded .dae file
-    executeConvertToXcodeColladaWorkflow(daePath)
+def getFighterTasks(fighterType, fighterPath, daePaths = None):
+    """
+    Returns the steps of updating a fighter as tasks. Steps only wait for the steps they depend on:
+    1. Update the .dae's name in fighterPath, or of daePaths if provided
+    2. Update the textures folder to assets in fighterPath
+    3. Create an animations folder and more folders for each categories
+    4. Update the name of the .png files in fighterPath/assets, after 2
+    4.5 Downscale and recompress the textures if OPTIMIZE_TEXTURES is True and Pillow is installed, after 4
+    7. Update .dae file's contents to still point to the updated assets, after 1
+    8. Convert the .dae file like the ConvertToXcodeCollada workflow, after 7
+    8.5 Move .dae inside assets folder, after 4 and 8
+    5. Rename the root fighter's path to its name, after every other step since they work inside it
+    6. Delete old fighterPath, with 5
+    """
+    if not os.path.isdir(fighterPath):
+        LOGE(f"Path is invalid: {fighterPath}")
+        return []
+    fighter = FIGHTERS[fighterType]
+    daePath = f"{fighterPath}/{fighterType.value}.dae"
+    renameDaeTask = Task(f"{fighter.name} 1. Rename .dae", lambda: renameDaeFile(fighter, fighterPath, daePaths))
+    renameTexturesFolderTask = Task(f"{fighter.name} 2. Rename textures folder", lambda: renameTexturesFolder(fighterPath))
+    createAnimationsFoldersTask = Task(f"{fighter.name} 3. Create animations folders", lambda: createAnimationsFolders(fighterPath))
+    renameTexturesTask = Task(f"{fighter.name} 4. Rename textures", lambda: renameTextures(fighter, fighterPath), [renameTexturesFolderTask])
+    updateDaeTask = Task(f"{fighter.name} 7. Update .dae textures", lambda: updateDaeFile(fighterType, daePath), [renameDaeTask])
+    convertDaeTask = Task(f"{fighter.name} 8. Convert .dae", lambda: convertToXcodeCollada(daePath), [updateDaeTask])
+    moveDaeTask = Task(f"{fighter.name} 8.5 Move .dae to assets", lambda: moveDaeToAssets(daePath), [renameTexturesTask, convertDaeTask])
+    tasks = [renameDaeTask, renameTexturesFolderTask, createAnimationsFoldersTask, renameTexturesTask, updateDaeTask, convertDaeTask, moveDaeTask]
+    renameFighterFolderDependencies = [createAnimationsFoldersTask, moveDaeTask]
+    if OPTIMIZE_TEXTURES and Image is not None:
+        optimizeTexturesTask = Task(f"{fighter.name} 4.5 Optimize textures", lambda: optimizeTextures(fighter, fighterPath), [renameTexturesTask])
+        tasks.append(optimizeTexturesTask)
+        renameFighterFolderDependencies.append(optimizeTexturesTask)
+    renameFighterFolderTask = Task(f"{fighter.name} 5-6. Rename fighter folder", lambda: renameFighterFolder(fighter, fighterPath), renameFighterFolderDependencies)
+    return tasks + [renameFighterFolderTask]
+
+def runTasks(tasks, jobCount):
+    """Runs every task as soon as its dependencies have finished, up to jobCount at the same time.
+    A task whose dependency failed or was skipped is skipped. Returns the seconds it took"""
+    startTime = time.perf_counter()
+    remainingTasks = list(tasks)
+    finishedTasks = set()
+    runningTasks = {} #Future -> task
+    with ThreadPoolExecutor(max_workers=jobCount) as executor:
+        while remainingTasks or runningTasks:
+            hasStartedTasks = False
+            for task in list(remainingTasks):
+                if any(dependency.error or dependency.isSkipped for dependency in task.dependencies):
+                    LOGE(f"Skipped {task.name} because a step it depends on failed")
+                    task.isSkipped = True
+                    finishedTasks.add(task)
+                elif all(dependency in finishedTasks for dependency in task.dependencies):
+                    runningTasks[executor.submit(task.run)] = task
+                else:
+                    continue
+                remainingTasks.remove(task)
+                hasStartedTasks = True
+            if runningTasks:
+                doneFutures, _ = wait(runningTasks, return_when=FIRST_COMPLETED)
+                for future in doneFutures:
+                    finishedTasks.add(runningTasks.pop(future))
+            elif not hasStartedTasks:
+                LOGE(f"Tasks can never run because their dependencies are missing: {[task.name for task in remainingTasks]}")
+                break
+    return time.perf_counter() - startTime
+
+def getCriticalPath(tasks):
+    """Returns the chain of dependent tasks with the longest total duration"""
+    longestPaths = {} #Task -> longest chain of tasks ending with it
+    for task in tasks: #Tasks are listed after their dependencies
+        longestDependencyPath = max((longestPaths.get(dependency, []) for dependency in task.dependencies), key=lambda path: sum(pathTask.duration for pathTask in path), default=[])
+        longestPaths[task] = longestDependencyPath + [task]
+    return max(longestPaths.values(), key=lambda path: sum(task.duration for task in path), default=[])
+
+def logTaskSummary(tasks, seconds):
+    """Logs failed and skipped tasks, the time saved by running tasks at the same time and the critical path"""
+    failedTasks = [task for task in tasks if task.error]
+    skippedTasks = [task for task in tasks if task.isSkipped]
+    for task in failedTasks:
+        LOGE(f"FAILED {task.name}: {task.error}")
+    totalDuration = sum(task.duration for task in tasks)
+    LOG(f"RESULT: Ran {len(tasks) - len(skippedTasks)} of {len(tasks)} tasks in {seconds:.2f}s, {totalDuration:.2f}s if run one at a time. {len(failedTasks)} failed and {len(skippedTasks)} skipped")
+    criticalPath = getCriticalPath(tasks)
+    LOG(f"Critical path of {sum(task.duration for task in criticalPath):.2f}s:")
+    for task in criticalPath:
+        LOG(f"\t{task.duration:.2f}s\t{task.name}")
 
-    #8.5 Move .dae inside assets folder
-    if exist(daePath):
-        LOGD("Moving .dae character to assets folder")
-        daeInAssetsPath = f"{getFolderFromPath(daePath)}/assets/{getNameFromPath(daePath, withExtension=True)}"
-        moveFile(daePath, daeInAssetsPath)
-        daePath = daeInAssetsPath
+def updateFighters(fighterType, fighterPath):
+    """Runs every step of updating a fighter. See getFighterTasks"""
+    LOGA(f"Updating fighterType: {fighterType.value}")
+    if not os.path.isdir(fighterPath) or not check_path_contains_files_with_type(fighterPath, ".dae"):
+        LOGE(f"Path is invalid: {fighterPath}")
+        return
+    runTasks(getFighterTasks(fighterType, fighterPath), 1)
     
 #----------------------------------------------------------------------------------------------------------------
 #################################################### Main #######################################################
 #----------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
-    """
-    Must have ConvertToXcodeCollada in Desktop/StreamCodes/scripts/ConvertToXcodeCollada/ConvertToXcodeCollada.workflow
-    """
-    pathToConvert = getPathToConvert()
+    pathToConvert, jobCount = getPathToConvert()
+    if OPTIMIZE_TEXTURES and Image is None:
+        LOGW("WARNING: Textures will not be optimized because Pillow is not installed. Install it with: pip3 install Pillow")
     fighterPathsDic = getFighterPaths(pathToConvert)
-    for (index, (fighterType, fighterPath)) in enumerate(fighterPathsDic.items()):
-        updateFighters(fighterType, fighterPath)
-        LOGA(f"Finished converting fighter#{index+1} in path {fighterPath} to {fighterType.name}")
+    # Run the steps of every fighter together, so one fighter's slow step does not hold up the others
+    tasks = []
+    for (fighterType, (fighterPath, daePaths)) in fighterPathsDic.items():
+        LOGA(f"Updating fighterType: {fighterType.value}")
+        tasks += getFighterTasks(fighterType, fighterPath, daePaths)
+    seconds = runTasks(tasks, jobCount)
+    logTaskSummary(tasks, seconds)
     
     LOG(f"RESULT: Total converted paths in <{pathToConvert}> is {len(fighterPathsDic)}")
     LOG(f"✅✅✅")
@@ -0,0 +1,222 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+import PIL
+from PIL import Image, ImageDraw
+
+import imageSizeGenerator
+
+SCALES = ['1x', '2x', '3x']
+IMAGESETS_PER_GROUP = 100
+
+def parse_size(text):
+    """Parse a WIDTHxHEIGHT size such as 1200x800."""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def make_base_image(size, mode, rng):
+    """Make a photo-like source with gradients and noise so it compresses realistically."""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 48)
+    channels = [gradient, noise, gradient.rotate(90).resize(size)]
+    if mode == 'RGBA':
+        channels.append(Image.radial_gradient('L').resize(size))
+    img = Image.merge(mode, channels)
+    draw = ImageDraw.Draw(img)
+    for _ in range(8):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + size[0] // 4, y + size[1] // 4), fill=tuple(rng.randrange(256) for _ in mode))
+    return img
+
+def build_catalog(catalog_path, imagesets, size, jpeg_ratio, missing, seed):
+    """Build a synthetic .xcassets catalog whose imagesets are missing the given scales."""
+    rng = random.Random(seed)
+    existing = [scale for scale in SCALES if scale not in missing]
+    largest_factor = int(existing[-1].replace('x', ''))
+    base_images = {
+        '.png': make_base_image(size, 'RGBA', rng),
+        '.jpg': make_base_image(size, 'RGB', rng),
+    }
+
+    os.makedirs(catalog_path)
+    with open(os.path.join(catalog_path, 'Contents.json'), 'w') as f:
+        json.dump({'info': {'version': 1, 'author': 'xcode'}}, f, indent=2)
+    for index in range(imagesets):
+        extension = '.jpg' if rng.random() < jpeg_ratio else '.png'
+        name = f"image{index:05d}"
+        dir_path = os.path.join(catalog_path, f"Group{index // IMAGESETS_PER_GROUP:03d}", f"{name}.imageset")
+        os.makedirs(dir_path)
+
+        # Make every imageset unique so no two sources are byte-identical
+        img = base_images[extension].copy()
+        ImageDraw.Draw(img).rectangle((0, 0, 15, 15), fill=tuple(rng.randrange(256) for _ in img.mode))
+        images = []
+        for scale in SCALES:
+            image = {'idiom': 'universal', 'scale': scale}
+            if scale in existing:
+                factor = int(scale.replace('x', ''))
+                filename = imageSizeGenerator.scale_filename(name, scale, extension)
+                scaled_size = (size[0] * factor // largest_factor, size[1] * factor // largest_factor)
+                (img if scaled_size == img.size else img.resize(scaled_size)).save(os.path.join(dir_path, filename))
+                image['filename'] = filename
+            images.append(image)
+        with open(os.path.join(dir_path, 'Contents.json'), 'w') as f:
+            json.dump({'images': images, 'info': {'version': 1, 'author': 'xcode'}}, f, indent=2)
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, and of its finished children such as process pool workers."""
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS and in KB on Linux
+    return {
+        'generator': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'workers': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+def generator_pass(catalog_path, options):
+    """Run imageSizeGenerator.main with stage timings and without prompting, then commit its journal.
+    Returns its summary, its duration and the peak RSS of this process, which only ran the generator."""
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        summary = imageSizeGenerator.main(catalog_path, prompt=False, profile=True, **options)
+    seconds = time.perf_counter() - start
+    journal_path = os.path.join(catalog_path, imageSizeGenerator.JOURNAL_FILENAME)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+    return {'summary': summary, 'seconds': seconds, 'peak_rss_bytes': peak_rss_bytes()}
+
+def run_generator(catalog_path, options):
+    """Run generator_pass in a fresh process, so its peak RSS leaves out building the catalog and earlier runs."""
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--generator-pass', catalog_path, json.dumps(options)], text=True)
+    return json.loads(output)
+
+def pipeline_stages(summary):
+    """Total seconds spent in every pipeline stage, summed over all imagesets and workers."""
+    return {name.split(':', 1)[1]: sum(values) for name, values in summary['stats'].items() if name.startswith('stage_seconds:')}
+
+def git_commit():
+    """Return the commit being benchmarked, or None outside a git checkout."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(args):
+    """Time cold runs on fresh copies of a synthetic catalog, each followed by a no-op rerun."""
+    options = {
+        'jobs': args.jobs,
+        'executor': args.executor,
+        'resampler': args.resampler,
+        'encoder': args.encoder,
+        'memory_budget': args.memory_budget * 1024 * 1024 if args.memory_budget else None,
+    }
+    commit = git_commit()
+    work_dir = tempfile.mkdtemp(prefix='imageSizeBenchmark')
+    try:
+        template_path = os.path.join(work_dir, 'Template.xcassets')
+        start = time.perf_counter()
+        build_catalog(template_path, args.imagesets, args.size, args.jpeg_ratio, args.missing, args.seed)
+        build_seconds = time.perf_counter() - start
+
+        runs = []
+        for run in range(args.runs):
+            catalog_path = os.path.join(work_dir, f"Run{run}.xcassets")
+            shutil.copytree(template_path, catalog_path)
+            process_pass = run_generator(catalog_path, options)
+            noop_pass = run_generator(catalog_path, options)
+            summary, process_seconds = process_pass['summary'], process_pass['seconds']
+            noop_summary, noop_seconds = noop_pass['summary'], noop_pass['seconds']
+            runs.append({
+                'stages': {
+                    'process': process_seconds,
+                    'noop_rerun': noop_seconds,
+                },
+                'pipeline_stages': pipeline_stages(summary),
+                'noop_pipeline_stages': pipeline_stages(noop_summary),
+                'imagesets_per_second': args.imagesets / process_seconds,
+                'noop_imagesets_per_second': args.imagesets / noop_seconds,
+                'populated': summary['populated'],
+                'unchanged_on_rerun': noop_summary['unchanged'],
+                'peak_rss_bytes': process_pass['peak_rss_bytes'],
+                'noop_peak_rss_bytes': noop_pass['peak_rss_bytes'],
+            })
+            shutil.rmtree(catalog_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = min(runs, key=lambda run: run['stages']['process'])
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {
+            'imagesets': args.imagesets,
+            'size': list(args.size),
+            'jpeg_ratio': args.jpeg_ratio,
+            'missing': args.missing,
+            'seed': args.seed,
+            'runs': args.runs,
+            **options,
+        },
+        'build_catalog_seconds': build_seconds,
+        'best_imagesets_per_second': best['imagesets_per_second'],
+        'best_noop_imagesets_per_second': max(run['noop_imagesets_per_second'] for run in runs),
+        # Highest peak of any generator run, each measured in its own process
+        'peak_rss_bytes': {key: max(run[name][key] for run in runs for name in ['peak_rss_bytes', 'noop_peak_rss_bytes']) for key in ['generator', 'workers']},
+        'runs': runs,
+    }
+
+def compare(result, baseline):
+    """Print the speedup of result over a baseline benchmark."""
+    for key in ['best_imagesets_per_second', 'best_noop_imagesets_per_second']:
+        speedup = result[key] / baseline[key]
+        print(f"{key}: {baseline[key]:.1f} -> {result[key]:.1f} ({speedup:.2f}x)", file=sys.stderr)
+    for key in ['generator', 'workers']:
+        if key not in baseline['peak_rss_bytes']:
+            continue  # Baselines from before each run was measured in its own process
+        print(f"peak_rss_bytes.{key}: {baseline['peak_rss_bytes'][key]:,} -> {result['peak_rss_bytes'][key]:,}", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark imageSizeGenerator on a synthetic asset catalog.')
+    parser.add_argument('--imagesets', type=int, default=200, help='Number of imagesets in the catalog (default: 200).')
+    parser.add_argument('--size', type=parse_size, default=(600, 600), metavar='WIDTHxHEIGHT', help='Size of the largest existing image of every imageset (default: 600x600).')
+    parser.add_argument('--jpeg-ratio', type=float, default=0.25, help='Fraction of imagesets made of JPEGs instead of PNGs (default: 0.25).')
+    parser.add_argument('--missing', type=lambda text: text.split(','), default=['1x', '2x'], help='Comma separated scales missing from every imageset (default: 1x,2x).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic catalog (default: 0).')
+    parser.add_argument('--runs', type=int, default=3, help='Number of timed runs, each on a fresh copy of the catalog (default: 3).')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Jobs passed to imageSizeGenerator (default: 1).')
+    parser.add_argument('--executor', choices=sorted(imageSizeGenerator.EXECUTORS), default='thread', help='Executor passed to imageSizeGenerator (default: thread).')
+    parser.add_argument('--resampler', choices=sorted(imageSizeGenerator.RESAMPLERS), default='lanczos', help='Resampler passed to imageSizeGenerator (default: lanczos).')
+    parser.add_argument('--encoder', choices=list(imageSizeGenerator.ENCODER_PRESETS), default='default', help='Encoder preset passed to imageSizeGenerator (default: default).')
+    parser.add_argument('--memory-budget', type=int, metavar='MB', help='Memory budget passed to imageSizeGenerator.')
+    parser.add_argument('-o', '--output', help='Write the JSON result to this file instead of stdout.')
+    parser.add_argument('--baseline', help='JSON result of an earlier benchmark to compare against.')
+    parser.add_argument('--generator-pass', nargs=2, metavar=('CATALOG', 'OPTIONS'), help=argparse.SUPPRESS)  # Used by run_generator
+    args = parser.parse_args()
+
+    if args.generator_pass:
+        catalog_path, options = args.generator_pass
+        print(json.dumps(generator_pass(catalog_path, json.loads(options))))
+        sys.exit(0)
+
+    if not args.missing or set(args.missing) - set(SCALES) or set(args.missing) == set(SCALES):
+        parser.error('--missing must name some, but not all, of 1x, 2x and 3x')
+
+    result = benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            compare(result, json.load(f))
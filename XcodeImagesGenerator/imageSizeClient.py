@@ -0,0 +1,60 @@
+import json
+import os
+import runpy
+import socket
+import sys
+import tempfile
+
+# Thin client of `imageSizeGenerator.py --serve` for build phases. It takes the same
+# arguments as imageSizeGenerator.py, never prompts, commits every run unless --no-prompt
+# is passed, and deliberately does not import Pillow so a warm run only pays for starting Python.
+
+GENERATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imageSizeGenerator.py')
+SOCKET_ENV_VAR = 'IMAGE_SIZE_GENERATOR_SOCKET'  # Same as imageSizeGenerator.SOCKET_ENV_VAR
+
+def default_socket_path():
+    """Same as imageSizeGenerator.default_socket_path."""
+    return os.path.join(tempfile.gettempdir(), f"imageSizeGenerator-{os.getuid()}.sock")
+
+def run_on_service(socket_path, argv):
+    """Run argv on a running service, streaming its output. Returns the exit code, or None if no service is running."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    with client:
+        client.sendall((json.dumps({'argv': argv, 'cwd': os.getcwd()}) + '\n').encode())
+        with client.makefile('r', encoding='utf-8') as f:
+            for line in f:
+                message = json.loads(line)
+                if 'out' in message:
+                    sys.stdout.write(message['out'])
+                    sys.stdout.flush()
+                elif 'err' in message:
+                    sys.stderr.write(message['err'])
+                    sys.stderr.flush()
+                elif 'exit' in message:
+                    return message['exit']
+    print("Error: The service closed the connection before the run finished", file=sys.stderr)
+    return 1
+
+def run_in_process(argv):
+    """Run imageSizeGenerator.py in this process, as if it had been invoked with argv."""
+    sys.argv = [GENERATOR_PATH] + argv
+    try:
+        runpy.run_path(GENERATOR_PATH, run_name='__main__')
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    return 0
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if '--no-prompt' not in argv and '--auto-commit' not in argv:
+        argv.append('--auto-commit')  # Behave the same with and without a service
+    socket_path = os.environ.get(SOCKET_ENV_VAR) or default_socket_path()
+    exit_code = run_on_service(socket_path, argv)
+    if exit_code is None:
+        exit_code = run_in_process(argv)
+    sys.exit(exit_code)
@@ -1,54 +1,754 @@
+import hashlib
+import io
 import json
+import math
 import os
+import struct
 import sys
+import threading
+import time
 import argparse
-from PIL import Image
+import contextlib
+import ctypes
+import ctypes.util
+import select
+import shutil
+import socket
+import tempfile
+import traceback
+from collections import deque
+from fractions import Fraction
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from PIL import Image, ImageChops, ImageStat
 
-def get_image_size(image_path):
-    """Get the size of an image."""
-    try:
-        img = Image.open(image_path)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+PENDING_JOBS_PER_WORKER = 4
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+# Peak memory of an imageset is about its decoded source plus the resized outputs and encoder buffers
+BYTES_PER_PIXEL = 4
+PEAK_MEMORY_FACTOR = 2
+# Resize huge reductions with an integer Image.reduce first; 3 or more is indistinguishable from a plain resize
+REDUCING_GAP = 3.0
+SLOWEST_IMAGESETS = 5  # Number of slowest imagesets listed with the stage timings
+# Modes Image.reduce and the NumPy backend can box filter
+BOX_FILTER_MODES = {'L', 'LA', 'RGB', 'RGBA'}
+# Pillow save() options of every encoder preset by image format
+ENCODER_PRESETS = {
+    'default': {},  # Pillow's defaults
+    'fast': {  # Low zlib level for quick local builds
+        'PNG': {'compress_level': 1},
+    },
+    'ship': {  # Smallest output for release builds
+        'PNG': {'optimize': True},
+        'JPEG': {'optimize': True, 'progressive': True},
+        'quantize': True,  # Store PNGs with at most 256 colors as lossless palette images
+    },
+}
+# Asset folders processed by this script
+IMAGE_SET_EXTENSIONS = ('.imageset', '.appiconset')
+# Asset folders that never contain imagesets, so the catalog walk does not descend into them
+LEAF_ASSET_EXTENSIONS = {
+    '.arobject',
+    '.arreferenceimage',
+    '.colorset',
+    '.dataset',
+    '.launchimage',
+    '.mipmapset',
+    '.sticker',
+    '.stickersequence',
+    '.symbolset',
+}
+
+def report(report_lines, line):
+    """Print a report line, or collect it when report_lines is provided."""
+    if report_lines is None:
+        print(line)
+    else:
+        report_lines.append(line)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# JPEG start-of-frame markers that carry the image dimensions
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+SIZE_INDEX_FILENAME = '.imageSizeIndex.json'
+MANIFEST_FILENAME = '.imageSizeManifest.json'
+JOURNAL_FILENAME = '.imageSizeGenerator.journal'
+JOURNAL_SYNC_ENTRIES = 256
+JOURNAL_SYNC_SECONDS = 1.0
+# Watch mode waits for a burst of file events to be quiet this long, but no longer than the max delay
+WATCH_DEBOUNCE_SECONDS = 0.05
+WATCH_MAX_DELAY_SECONDS = 0.5
+POLL_INTERVAL_SECONDS = 1.0
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# Bump when a change to resizing or encoding makes cached images stale
+RESIZE_CACHE_VERSION = 1
+DEFAULT_CACHE_SIZE_MB = 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl that makes a copy-on-write reflink of a file
+# Overrides the socket of --serve and imageSizeClient.py
+SOCKET_ENV_VAR = 'IMAGE_SIZE_GENERATOR_SOCKET'
+
+def read_png_size(f):
+    """Read the size of a PNG from its IHDR chunk."""
+    header = f.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        raise ValueError("Missing PNG IHDR chunk")
+    return struct.unpack('>II', header[16:24])
+
+def read_jpeg_size(f):
+    """Read the size of a JPEG from its first SOF segment."""
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError("Missing JPEG SOI marker")
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Missing JPEG SOF segment")
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # Skip fill bytes
+            marker = f.read(1)
+        if not marker:
+            raise ValueError("Missing JPEG SOF segment")
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:  # Markers without a segment
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+def probe_image_size(image_path):
+    """Get the size of a PNG or JPEG by reading only its header."""
+    with open(image_path, 'rb') as f:
+        signature = f.read(8)
+        f.seek(0)
+        if signature == PNG_SIGNATURE:
+            return read_png_size(f)
+        if signature[:2] == b'\xff\xd8':
+            return read_jpeg_size(f)
+    # Let Pillow identify anything else without decoding its pixels
+    with Image.open(image_path) as img:
         return img.size
+
+class ImageSizeIndex:
+    """On-disk cache of image sizes keyed by path, mtime and file size."""
+    
+    def __init__(self, index_path, entries=None):
+        self.index_path = index_path
+        self.root = os.path.dirname(index_path)
+        self.entries = entries or {}
+        self.new_entries = {}
+    
+    @classmethod
+    def load(cls, index_path):
+        """Load an index, starting empty when it is missing or unreadable."""
+        try:
+            with open(index_path, 'r') as f:
+                return cls(index_path, json.load(f)['entries'])
+        except (OSError, ValueError, KeyError):
+            return cls(index_path)
+    
+    def get_size(self, image_path):
+        """Return the size of image_path, probing its header only when it changed."""
+        key = os.path.relpath(image_path, self.root)
+        stat = os.stat(image_path)
+        entry = self.entries.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2], entry[3]
+        size = probe_image_size(image_path)
+        entry = [stat.st_mtime_ns, stat.st_size, size[0], size[1]]
+        self.entries[key] = entry
+        self.new_entries[key] = entry
+        return size
+    
+    def take_new_entries(self):
+        """Return and forget the entries probed since the last call."""
+        new_entries, self.new_entries = self.new_entries, {}
+        return new_entries
+    
+    def merge(self, entries):
+        """Add entries probed by a worker process."""
+        self.entries.update(entries)
+        self.new_entries.update(entries)
+    
+    def save(self):
+        """Atomically write the index if anything new was probed."""
+        if not self.take_new_entries():
+            return
+        write_json_atomic(self.index_path, {'entries': self.entries})
+
+def write_text_atomic(path, text):
+    """Write text to a temp file and rename it over path."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def write_json_atomic(path, data):
+    """Write compact JSON to a temp file and rename it over path."""
+    write_text_atomic(path, json.dumps(data, separators=(',', ':')))
+
+def imageset_fingerprint(dir_path):
+    """Fingerprint an imageset from its Contents.json content and the name, size and mtime of its files."""
+    digest = hashlib.sha1()
+    with os.scandir(dir_path) as it:
+        entries = sorted((entry for entry in it if entry.is_file() and not entry.name.startswith('.')), key=lambda entry: entry.name)
+    for entry in entries:
+        stat = entry.stat()
+        digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+        if entry.name == 'Contents.json':
+            with open(entry.path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def imageset_unchanged(manifest, dir_path):
+    """Return True if the imageset at dir_path still matches its entry in manifest."""
+    try:
+        return manifest.is_unchanged(manifest.key(dir_path), imageset_fingerprint(dir_path))
+    except OSError:
+        return False
+
+class ImagesetManifest:
+    """Sidecar manifest of the fingerprint and outputs of every imageset seen by the last run."""
+    
+    def __init__(self, manifest_path, entries=None):
+        self.manifest_path = manifest_path
+        self.root = os.path.dirname(manifest_path)
+        self.entries = entries or {}
+    
+    @classmethod
+    def load(cls, manifest_path):
+        """Load a manifest, starting empty when it is missing or unreadable."""
+        try:
+            with open(manifest_path, 'r') as f:
+                return cls(manifest_path, json.load(f)['imagesets'])
+        except (OSError, ValueError, KeyError):
+            return cls(manifest_path)
+    
+    def key(self, dir_path):
+        return os.path.relpath(dir_path, self.root)
+    
+    def is_unchanged(self, key, fingerprint):
+        """Return True if the imageset matches the fingerprint recorded by the last run."""
+        entry = self.entries.get(key)
+        return entry is not None and entry['fingerprint'] == fingerprint
+    
+    def save(self):
+        write_json_atomic(self.manifest_path, {'imagesets': self.entries})
+
+size_index = None  # ImageSizeIndex shared by the imagesets of the current run
+imageset_manifest = None  # ImagesetManifest of the last run, or None to process every imageset
+undo_journal_file = None  # UndoJournal every change is written to before it is made
+run_options = {
+    'resampler': 'lanczos',  # Key of RESAMPLERS used for every resize
+    'quality_check': False,  # Record the PSNR of every resize against the Lanczos reference
+    'encoder': 'default',  # Key of ENCODER_PRESETS used to save every image
+    'jpeg_quality': None,  # JPEG quality overriding the preset's, or None
+    'compare_encoders': False,  # Also encode every image in memory with the other presets
+    'instrument': False,  # Time every pipeline stage with spans
+    'trace': False,  # Also keep every span as a Chrome trace event
+    'cache_dir': None,  # Folder of the ResizeCache shared across runs and catalogs, or None
+    'cache_bytes': DEFAULT_CACHE_SIZE_MB * 1024 * 1024,  # Size the ResizeCache is trimmed to after a run
+}
+job_stats = threading.local()  # Statistics of the imageset being processed by this thread
+warm_sidecars = None  # Catalog root -> (sidecar stamps, ImageSizeIndex, ImagesetManifest) kept by --serve
+
+def init_worker(index, manifest, journal, options):
+    """Set the size index, manifest, journal and options used while processing, also in worker processes."""
+    global size_index, imageset_manifest, undo_journal_file
+    size_index = index
+    imageset_manifest = manifest
+    undo_journal_file = journal
+    run_options.update(options)
+
+def record_stat(name, value):
+    """Record a sample of a statistic for the imageset being processed."""
+    stats = getattr(job_stats, 'stats', None)
+    if stats is not None:
+        stats.setdefault(name, []).append(value)
+
+class Span:
+    """Times one pipeline stage of the imageset being processed."""
+    __slots__ = ('name', 'args', 'start')
+    
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+    
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter_ns() - self.start
+        record_stat(f"stage_seconds:{self.name}", duration / 1e9)
+        if run_options['trace']:
+            # perf_counter uses a system-wide monotonic clock, so events of worker processes line up
+            record_stat('trace_events', {
+                'name': self.name,
+                'cat': 'imageSizeGenerator',
+                'ph': 'X',
+                'ts': self.start / 1000,
+                'dur': duration / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_native_id(),
+                'args': self.args,
+            })
+
+NULL_SPAN = contextlib.nullcontext()
+
+def span(name, **args):
+    """Return a context manager timing a pipeline stage when instrumentation is on."""
+    if not run_options['instrument']:
+        return NULL_SPAN
+    return Span(name, args)
+
+def summarize_stages(stats, imageset_seconds):
+    """Describe the total time of every stage and the slowest imagesets."""
+    lines = []
+    stages = [(name.split(':', 1)[1], values) for name, values in stats.items() if name.startswith('stage_seconds:')]
+    for stage, values in sorted(stages, key=lambda stage: sum(stage[1]), reverse=True):
+        lines.append(f"Stage {stage}: {sum(values):.3f}s over {len(values)} calls")
+    for seconds, dir_path in sorted(imageset_seconds, reverse=True)[:SLOWEST_IMAGESETS]:
+        lines.append(f"Slow imageset {os.path.basename(dir_path)}: {seconds:.3f}s")
+    return lines
+
+def write_chrome_trace(trace_path, events):
+    """Write trace events, named per process and thread, for chrome://tracing or Perfetto."""
+    main_pid = os.getpid()
+    metadata = []
+    for pid, tid in sorted({(event['pid'], event['tid']) for event in events}):
+        metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': f"worker {tid}"}})
+    for pid in sorted({event['pid'] for event in events}):
+        name = 'imageSizeGenerator' if pid == main_pid else f"worker process {pid}"
+        metadata.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': name}})
+    with open(trace_path, 'w') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+
+def get_image_size(image_path, report_lines=None):
+    """Get the size of an image from its header, using the size index when set."""
+    try:
+        with span('probe'):
+            if size_index is not None:
+                return size_index.get_size(image_path)
+            return probe_image_size(image_path)
     except Exception as e:
-        print(f"Error opening image: {e}")
+        report(report_lines, f"Error reading size of {image_path}: {e}")
         return None
 
+def scaled_size(size, ratio):
+    """Scale a (width, height) size by a (width_ratio, height_ratio) pair."""
+    return (max(1, int(size[0] * ratio[0])), max(1, int(size[1] * ratio[1])))
+
+def integer_factor(size, new_size):
+    """Return the integer factor between size and new_size, or None if it is not exact."""
+    factor_w, remainder_w = divmod(size[0], new_size[0])
+    factor_h, remainder_h = divmod(size[1], new_size[1])
+    if remainder_w or remainder_h or factor_w != factor_h:
+        return None
+    return factor_w
+
+class LanczosResampler:
+    """Reference backend: Pillow's Lanczos filter."""
+    
+    def resize(self, img, size):
+        # Use LANCZOS for better quality, after an integer Image.reduce pre-shrink for huge reductions
+        return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+class ReduceResampler(LanczosResampler):
+    """Fast backend: Image.reduce box filtering for exact integer factors such as 3x->1x,
+    otherwise an integer Image.reduce followed by a short Lanczos resize."""
+    
+    def resize(self, img, size):
+        if img.mode not in BOX_FILTER_MODES:
+            return super().resize(img, size)
+        factor = integer_factor(img.size, size)
+        if factor:
+            return img.reduce(factor)
+        factor = min(img.size[0] // size[0], img.size[1] // size[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+        return img.resize(size, Image.Resampling.LANCZOS)
+
+class NumpyResampler(LanczosResampler):
+    """Vectorised NumPy box filter for exact integer factors, falling back to Lanczos otherwise."""
+    
+    def resize(self, img, size):
+        factor = integer_factor(img.size, size)
+        if not factor or img.mode not in BOX_FILTER_MODES:
+            return super().resize(img, size)
+        pixels = numpy.asarray(img, dtype=numpy.float32).reshape(img.size[1], img.size[0], -1)
+        if img.mode in ('LA', 'RGBA'):
+            # Average premultiplied colors so transparent pixels do not bleed into their neighbours
+            alpha = pixels[..., -1:]
+            pixels = numpy.concatenate((pixels[..., :-1] * alpha, alpha), axis=-1)
+        blocks = pixels.reshape(size[1], factor, size[0], factor, pixels.shape[-1]).mean(axis=(1, 3))
+        if img.mode in ('LA', 'RGBA'):
+            alpha = blocks[..., -1:]
+            blocks[..., :-1] = numpy.divide(blocks[..., :-1], alpha, out=numpy.zeros_like(blocks[..., :-1]), where=alpha > 0)
+        blocks = numpy.clip(numpy.rint(blocks), 0, 255).astype(numpy.uint8)
+        return Image.fromarray(blocks.squeeze(axis=-1) if blocks.shape[-1] == 1 else blocks, img.mode)
+
+RESAMPLERS = {
+    'lanczos': LanczosResampler(),
+    'reduce': ReduceResampler(),
+    'numpy': NumpyResampler(),
+}
+
+def image_psnr(img, reference):
+    """Return the peak signal-to-noise ratio of img against reference in dB."""
+    if img.mode != reference.mode:
+        img = img.convert(reference.mode)
+    squares = ImageStat.Stat(ImageChops.difference(img, reference)).sum2
+    mse = sum(squares) / (len(squares) * reference.size[0] * reference.size[1])
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+def summarize_psnr(values):
+    """Describe PSNR samples, counting images identical to the reference separately."""
+    finite = [value for value in values if value != math.inf]
+    summary = f"{len(values) - len(finite)} of {len(values)} images identical"
+    if finite:
+        summary += f", PSNR of the rest min {min(finite):.2f} dB, mean {sum(finite) / len(finite):.2f} dB"
+    return summary
+
+def pick_pyramid_source(buffers, size):
+    """Pick the smallest decoded buffer that is an exact integer multiple of size."""
+    best = buffers[0]
+    for buffer in buffers[1:]:
+        if not integer_factor(buffer.size, size):
+            continue
+        if buffer.size[0] * buffer.size[1] < best.size[0] * best.size[1]:
+            best = buffer
+    return best
+
+def build_resize_pyramid(img, sizes, resampler=None):
+    """Resize one decoded image into every size in sizes.
+    Sizes are produced largest first, and each one is downsampled from the smallest
+    already produced buffer that is an exact integer multiple of it (e.g. 2x->1x),
+    falling back to the decoded source."""
+    resampler = resampler or RESAMPLERS[run_options['resampler']]
+    buffers = [img]
+    resized = {}
+    for size in sorted(set(sizes), key=lambda size: size[0] * size[1], reverse=True):
+        if size == img.size:
+            resized[size] = img
+            continue
+        source = pick_pyramid_source(buffers, size)
+        resized[size] = resampler.resize(source, size)
+        if run_options['quality_check']:
+            record_stat('psnr', image_psnr(resized[size], RESAMPLERS['lanczos'].resize(img, size)))
+        buffers.append(resized[size])
+    return resized
+
+def strip_scale_suffix(base_filename):
+    """Remove a trailing @1x, @2x or @3x from a filename without its extension."""
+    for suffix in ('@1x', '@2x', '@3x'):
+        if base_filename.endswith(suffix):
+            return base_filename[:-len(suffix)]
+    return base_filename
+
+def scale_filename(base_filename, size_name, extension):
+    """Return the filename of an image at size_name, e.g. icon@2x.png."""
+    if size_name == '1x':
+        return f"{base_filename}{extension}"
+    return f"{base_filename}@{size_name}{extension}"
+
+def quantize_losslessly(img):
+    """Convert an image with at most 256 colors to a palette image, if that loses nothing."""
+    if img.mode not in ('RGB', 'RGBA') or img.getcolors(256) is None:
+        return img
+    method = Image.Quantize.MEDIANCUT if img.mode == 'RGB' else Image.Quantize.FASTOCTREE
+    quantized = img.quantize(colors=256, method=method)
+    if ImageChops.difference(quantized.convert(img.mode), img).getbbox() is not None:
+        return img
+    return quantized
+
+def encode_image(img, fp, image_format, preset):
+    """Encode an image to a path or file object with an ENCODER_PRESETS preset."""
+    params = dict(ENCODER_PRESETS[preset].get(image_format, {}))
+    if image_format == 'JPEG' and run_options['jpeg_quality']:
+        params['quality'] = run_options['jpeg_quality']
+    quantized = quantize_losslessly(img) if image_format == 'PNG' and ENCODER_PRESETS[preset].get('quantize') else img
+    if quantized is img:
+        img.save(fp, format=image_format, **params)
+        return
+    # A palette does not always compress better, so keep whichever encoding is smaller
+    encodings = []
+    for candidate in (img, quantized):
+        buffer = io.BytesIO()
+        candidate.save(buffer, format=image_format, **params)
+        encodings.append(buffer.getvalue())
+    data = min(encodings, key=len)
+    if isinstance(fp, str):
+        with open(fp, 'wb') as f:
+            f.write(data)
+    else:
+        fp.write(data)
+
+def save_image_atomic(img, path):
+    """Encode an image to a hidden temp file next to path and rename it over path."""
+    image_dir, filename = os.path.split(path)
+    temp_path = os.path.join(image_dir, f".{filename}.tmp")
+    image_format = Image.registered_extensions()[os.path.splitext(filename)[1].lower()]
+    preset = run_options['encoder']
+    start = time.perf_counter()
+    with span('encode', filename=filename):
+        encode_image(img, temp_path, image_format, preset)
+    record_stat(f"encode_seconds:{preset}", time.perf_counter() - start)
+    record_stat(f"encoded_bytes:{preset}", os.path.getsize(temp_path))
+    os.replace(temp_path, path)
+    
+    if run_options['compare_encoders']:
+        # Encode in memory with every other preset to compare sizes and times
+        for other_preset in ENCODER_PRESETS:
+            if other_preset == preset:
+                continue
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            encode_image(img, buffer, image_format, other_preset)
+            record_stat(f"encode_seconds:{other_preset}", time.perf_counter() - start)
+            record_stat(f"encoded_bytes:{other_preset}", buffer.tell())
+
+def summarize_encoders(stats):
+    """Describe the bytes written and encode time of every preset with statistics."""
+    lines = []
+    default_bytes = sum(stats.get('encoded_bytes:default', []))
+    for preset in ENCODER_PRESETS:
+        if f"encoded_bytes:{preset}" not in stats:
+            continue
+        encoded_bytes = sum(stats[f"encoded_bytes:{preset}"])
+        line = f"Encoder {preset}: {encoded_bytes:,} bytes in {sum(stats[f'encode_seconds:{preset}']):.2f}s"
+        if default_bytes and preset != 'default':
+            line += f", {default_bytes - encoded_bytes:,} bytes ({(default_bytes - encoded_bytes) / default_bytes:.1%}) saved vs default"
+        lines.append(line)
+    return lines
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def clone_file(src, dst):
+    """Create dst with the content of src, as a reflink or hardlink where the filesystem allows, else as a copy."""
+    if sys.platform == 'darwin':
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+            return
+    elif fcntl is not None:
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                return
+            except OSError:
+                pass
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class ResizeCache:
+    """Content-addressed folder of resized images, shared across runs and catalogs.
+    An image is keyed by the hash of its source, every size resized from it in the
+    same pass and the resize and encoder settings, so a hit is byte-identical to a
+    fresh resize. The least recently used images are removed by trim."""
+    __slots__ = ('root',)
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def keys(self, source_path, outputs):
+        """Return the cache key of every (size, path) output resized from source_path in one pass."""
+        source_hash = file_sha256(source_path)
+        sizes = sorted({size for size, path in outputs})
+        keys = []
+        for size, path in outputs:
+            settings = [RESIZE_CACHE_VERSION, source_hash, sizes, size, run_options['resampler'], run_options['encoder'], run_options['jpeg_quality'], os.path.splitext(path)[1].lower()]
+            keys.append(hashlib.sha256(json.dumps(settings).encode()).hexdigest())
+        return keys
+    
+    def entry_path(self, key, extension):
+        return os.path.join(self.root, key[:2], f"{key}{extension}")
+    
+    def fetch(self, key, path):
+        """Materialise a cached image at path. Returns False on a miss."""
+        entry_path = self.entry_path(key, os.path.splitext(path)[1].lower())
+        image_dir, filename = os.path.split(path)
+        temp_path = os.path.join(image_dir, f".{filename}.tmp")
+        try:
+            clone_file(entry_path, temp_path)
+            os.replace(temp_path, path)
+            # Mark the entry as recently used through its atime only, since hardlinked outputs share its mtime
+            os.utime(entry_path, ns=(time.time_ns(), os.stat(entry_path).st_mtime_ns))
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            return False
+        return True
+    
+    def store(self, key, path):
+        """Add a newly encoded image to the cache, ignoring failures."""
+        entry_path = self.entry_path(key, os.path.splitext(path)[1].lower())
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            clone_file(path, temp_path)
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            print(f"Warning: Could not add {os.path.basename(path)} to the resize cache: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+    
+    def trim(self, max_bytes):
+        """Remove the least recently used images until the cache fits in max_bytes. Returns the bytes removed."""
+        entries = []
+        for dir_path, dirs, files in os.walk(self.root):
+            for filename in files:
+                path = os.path.join(dir_path, filename)
+                with contextlib.suppress(OSError):
+                    stat = os.stat(path)
+                    entries.append((stat.st_atime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        removed_bytes = 0
+        for _, size, path in sorted(entries):
+            if total_bytes - removed_bytes <= max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                removed_bytes += size
+        return removed_bytes
+
+def estimate_imageset_memory(dir_path):
+    """Estimate the peak memory needed to process an imageset from the header of its largest image."""
+    largest_area = 0
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if entry.name.startswith('.') or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            img_size = get_image_size(entry.path, [])
+            if img_size:
+                largest_area = max(largest_area, img_size[0] * img_size[1])
+    return largest_area * BYTES_PER_PIXEL * PEAK_MEMORY_FACTOR
+
+def decode_for_sizes(img, sizes):
+    """Decode an opened image once, at the smallest JPEG draft scale that still covers every size."""
+    with span('decode', pixels=img.size[0] * img.size[1]):
+        if img.format == 'JPEG':
+            # Let the decoder downscale by 1/2, 1/4 or 1/8 while decoding, never below the largest new size
+            img.draft(img.mode, max(sizes, key=lambda size: size[0] * size[1]))
+        img.load()
+
+def generate_sizes(image_path, outputs):
+    """Resize image_path into outputs, a list of (size, path), from a single decode.
+    With a resize cache, cached outputs are materialised from it and the source is
+    only decoded if one of them is missing."""
+    cache = ResizeCache(run_options['cache_dir']) if run_options['cache_dir'] else None
+    missing = list(outputs)
+    if cache is not None:
+        with span('cache_fetch'):
+            keys = dict(zip(outputs, cache.keys(image_path, outputs)))
+            missing = [output for output in outputs if not cache.fetch(keys[output], output[1])]
+        record_stat('cache_hits', len(outputs) - len(missing))
+        record_stat('cache_misses', len(missing))
+    if not missing:
+        return
+    
+    with Image.open(image_path) as img:
+        # Always resize every size, so the cascade and output match an uncached run
+        decode_for_sizes(img, [size for size, path in outputs])
+        with span('resize'):
+            resized = build_resize_pyramid(img, [size for size, path in outputs])
+        for size, path in missing:
+            save_image_atomic(resized[size], path)
+            if cache is not None:
+                with span('cache_store'):
+                    cache.store(keys[(size, path)], path)
+
 def generate_missing_sizes(image_path, target_sizes, original_extension, base_filename):
-    """Generate missing image sizes."""
+    """Generate missing image sizes from a single decode of image_path."""
     image_dir = os.path.dirname(image_path)
     
+    # Calculate every new size from its size ratio to the probed source size
+    source_size = get_image_size(image_path)
+    outputs = []
+    new_filenames = []
     for size_name, target_size in target_sizes.items():
-        # Calculate the new size based on the target size ratio
-        img = Image.open(image_path)
-        current_size = img.size
-        new_width = int(current_size[0] * target_size[0])
-        new_height = int(current_size[1] * target_size[1])
-        
-        # Open and resize the image
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)  # Use LANCZOS for better quality
-        
-        # Save the resized image
-        if size_name == '1x':
-            new_filename = f"{base_filename}{original_extension}"
-        else:
-            new_filename = f"{base_filename}@{size_name}{original_extension}"
-        new_path = os.path.join(image_dir, new_filename)
-        img.save(new_path)
-        
-        # Display green check marks based on size
-        # print(f"Generated: {new_filename} ✅")
-        
-        return new_filename
+        new_filename = scale_filename(base_filename, size_name, original_extension)
+        outputs.append((scaled_size(source_size, target_size), os.path.join(image_dir, new_filename)))
+        new_filenames.append(new_filename)
+    generate_sizes(image_path, outputs)
+    return new_filenames
+
+def generate_icon_sizes(image_path, filenames):
+    """Generate every icon of filenames, a dict of pixel size -> filename, from a single decode of image_path."""
+    image_dir = os.path.dirname(image_path)
+    generate_sizes(image_path, [(size, os.path.join(image_dir, filename)) for size, filename in filenames.items()])
 
-def parse_contents_json(json_path, undo_log):
-    """Parse Contents.json to determine image sizes."""
+def icon_pixel_size(image):
+    """Return the pixel size of an app icon entry, e.g. (167, 167) for 83.5x83.5 at 2x, or None."""
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        width, height = (Fraction(value) for value in image['size'].split('x'))
+        scale = int(image.get('scale', '1x').replace('x', ''))
+    except (KeyError, ValueError):
+        return None
+    return (round(width * scale), round(height * scale))
+
+def icon_filename(base_filename, pixel_size):
+    """Return the filename of a generated icon, e.g. AppIcon-120.png."""
+    width, height = pixel_size
+    if width == height:
+        return f"{base_filename}-{width}.png"
+    return f"{base_filename}-{width}x{height}.png"
+
+class ImageSet:
+    """An imageset whose Contents.json is loaded once. Renames, generated images and
+    JSON edits are planned in memory, then applied in one batch."""
+    __slots__ = ('dir_path', 'json_path', 'original_json', 'data', 'scales', 'renames', 'source_filename', 'target_sizes', 'extension', 'base_filename')
+    
+    def __init__(self, dir_path, original_json):
+        self.dir_path = dir_path
+        self.json_path = os.path.join(dir_path, 'Contents.json')
+        self.original_json = original_json
+        self.data = json.loads(original_json)
+        self.scales = {}  # Planned filename of each supported scale
+        self.renames = {}  # Planned filename -> filename on disk
+        self.source_filename = None
+        self.target_sizes = {}
+        self.extension = None
+        self.base_filename = None
+    
+    @classmethod
+    def load(cls, dir_path, report_lines=None):
+        """Read Contents.json once and plan the renames of images missing their @scale suffix."""
+        try:
+            with span('parse_json'), open(os.path.join(dir_path, 'Contents.json'), 'r') as f:
+                imageset = cls(dir_path, f.read())
             
             # Extract scale information from JSON
-            scales = {}
-            for image in data['images']:
+            for image in imageset.data['images']:
                 scale = image.get('scale', '1x')
                 filename = image.get('filename', None)
                 
@@ -59,142 +759,273 @@ def parse_contents_json(json_path, undo_log):
                 # Rename the image if necessary
                 base_filename, extension = os.path.splitext(filename)
                 if '@' not in filename and scale != '1x':
-                    new_filename = f"{base_filename.replace('x', '')}@{scale}{extension}"
-                    os.rename(os.path.join(os.path.dirname(json_path), filename), os.path.join(os.path.dirname(json_path), new_filename))
-                    undo_log.append({
-                        'old_path': os.path.join(os.path.dirname(json_path), filename),
-                        'new_path': os.path.join(os.path.dirname(json_path), new_filename)
-                    })
+                    new_filename = f"{base_filename}@{scale}{extension}"
+                    imageset.plan_rename(filename, new_filename)
                     image['filename'] = new_filename  # Update filename in JSON data
                 
                 # Determine the file extension
                 _, extension = os.path.splitext(image['filename'])
                 if extension not in ['.png', '.jpg', '.jpeg']:
-                    print(f"Skipping unsupported file type: {image['filename']}")
+                    report(report_lines, f"Skipping unsupported file type: {image['filename']}")
                     continue
                 
-                if scale not in scales:
-                    scales[scale] = image['filename']
+                if scale not in imageset.scales:
+                    imageset.scales[scale] = image['filename']
             
-            return data, scales
-    except Exception as e:
-        print(f"Error parsing JSON: {e}")
-        return None, None
-
-def update_contents_json(json_path, scales, undo_log):
-    """Update Contents.json with new image information."""
-    try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-        
-        # Create a backup of the original JSON file
-        backup_path = f"{json_path}_backup"
-        with open(backup_path, 'w') as f_backup:
-            json.dump(data, f_backup, indent=2)
-        undo_log.append({
-            'json_backup_path': backup_path,
-            'json_path': json_path
-        })
-        
-        # Remove old images
-        data['images'] = []
+            return imageset
+        except Exception as e:
+            report(report_lines, f"Error parsing JSON: {e}")
+            return None
+    
+    def path(self, filename):
+        return os.path.join(self.dir_path, filename)
+    
+    def disk_path(self, filename):
+        """Return the current path of an image that may have a planned rename."""
+        return self.path(self.renames.get(filename, filename))
+    
+    def plan_rename(self, filename, new_filename):
+        if filename != new_filename:
+            self.renames[new_filename] = self.renames.pop(filename, filename)
+    
+    def plan_generated(self, source_filename, target_sizes, extension, base_filename):
+        """Plan resizing source_filename into every size in target_sizes."""
+        self.source_filename = source_filename
+        self.target_sizes = target_sizes
+        self.extension = extension
+        self.base_filename = base_filename
+    
+    def generated_filenames(self):
+        return [scale_filename(self.base_filename, size_name, self.extension) for size_name in self.target_sizes]
+    
+    def plan_scales(self, scales):
+        """Plan the filename of every scale, renaming existing images to match, and the new images list."""
+        for size, filename in scales.items():
+            if size in self.scales and size not in self.target_sizes:
+                self.plan_rename(self.scales[size], filename)
+                if self.scales[size] == self.source_filename:
+                    # Generate from the source under the name it is renamed to
+                    self.source_filename = filename
+            self.scales[size] = filename
         
         # Add new image information in correct order
+        self.data['images'] = []
         for size in ['1x', '2x', '3x']:
-            if size in scales:
+            if size in self.scales:
                 new_image = {
                     "idiom": "universal",
-                    "filename": scales[size],
+                    "filename": self.scales[size],
                     "scale": size
                 }
-                data['images'].append(new_image)
-        
-        # Convert data to JSON string
-        json_str = json.dumps(data, indent=2)
+                self.data['images'].append(new_image)
+    
+    def apply(self, undo_log):
+        """Journal every planned change, then rename, generate and write Contents.json once."""
+        renames = [(old_filename, new_filename) for new_filename, old_filename in self.renames.items()]
+        for old_filename, new_filename in renames:
+            undo_log.append({
+                'old_path': self.path(old_filename),
+                'new_path': self.path(new_filename)
+            })
+        for new_filename in self.generated_filenames():
+            undo_log.append({
+                'generated_path': self.path(new_filename)
+            })
+        undo_log.append({
+            'json_path': self.json_path,
+            'original_json': self.original_json
+        })
         
-        # Write updated data back to JSON
-        with open(json_path, 'w') as f:
-            f.write(json_str)
+        with span('rename'):
+            for old_filename, new_filename in renames:
+                os.rename(self.path(old_filename), self.path(new_filename))
+        if self.target_sizes:
+            generate_missing_sizes(self.path(self.source_filename), self.target_sizes, self.extension, self.base_filename)
+        with span('write_json'):
+            write_text_atomic(self.json_path, json.dumps(self.data, indent=2))
+
+class AppIconSet:
+    """An appiconset whose Contents.json lists the size, scale and idiom of every icon.
+    Every missing icon is planned in memory, then generated from one decode of the
+    largest existing icon and written with the JSON in one batch."""
+    __slots__ = ('dir_path', 'json_path', 'original_json', 'data', 'source_filename', 'generated')
+    
+    def __init__(self, dir_path, original_json):
+        self.dir_path = dir_path
+        self.json_path = os.path.join(dir_path, 'Contents.json')
+        self.original_json = original_json
+        self.data = json.loads(original_json)
+        self.source_filename = None
+        self.generated = {}  # Pixel size -> filename of each icon to generate
+    
+    @classmethod
+    def load(cls, dir_path, report_lines=None):
+        """Read Contents.json once."""
+        try:
+            with span('parse_json'), open(os.path.join(dir_path, 'Contents.json'), 'r') as f:
+                return cls(dir_path, f.read())
+        except Exception as e:
+            report(report_lines, f"Error parsing JSON: {e}")
+            return None
+    
+    def path(self, filename):
+        return os.path.join(self.dir_path, filename)
+    
+    def apply(self, undo_log):
+        """Journal every planned change, then generate the icons and write Contents.json once."""
+        for filename in self.generated.values():
+            undo_log.append({
+                'generated_path': self.path(filename)
+            })
+        undo_log.append({
+            'json_path': self.json_path,
+            'original_json': self.original_json
+        })
         
-    except Exception as e:
-        print(f"Error updating JSON: {e}")
+        if self.generated:
+            generate_icon_sizes(self.path(self.source_filename), self.generated)
+        with span('write_json'):
+            write_text_atomic(self.json_path, json.dumps(self.data, indent=2))
+
+class AssetCatalog:
+    """An .xcassets folder and the sidecar files kept at its root."""
+    __slots__ = ('root',)
+    
+    def __init__(self, root):
+        self.root = root
+    
+    @property
+    def size_index_path(self):
+        return os.path.join(self.root, SIZE_INDEX_FILENAME)
+    
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILENAME)
+    
+    @property
+    def journal_path(self):
+        return os.path.join(self.root, JOURNAL_FILENAME)
+    
+    def imagesets(self):
+        return iter_imagesets(self.root)
 
-def process_imageset(dir_path, undo_log):
-    """Process an imageset directory."""
+def process_appiconset(dir_path, undo_log, report_lines=None):
+    """Fill in every missing icon of an appiconset directory from its largest icon."""
+    iconset = AppIconSet.load(dir_path, report_lines)
+    if iconset is None:
+        return
+    
+    # Probe the existing icons, and collect the entries still missing one
+    existing = {}  # Pixel size -> filename of an existing icon
+    missing = []
+    for image in iconset.data.get('images', []):
+        pixel_size = icon_pixel_size(image)
+        if pixel_size is None:
+            report(report_lines, f"Skipping icon without a valid size in {os.path.basename(dir_path)}: {image}")
+            continue
+        filename = image.get('filename', None)
+        if filename and os.path.exists(iconset.path(filename)):
+            img_size = get_image_size(iconset.path(filename), report_lines)
+            if img_size:
+                existing.setdefault(img_size, filename)
+            continue
+        missing.append((image, pixel_size))
+    
+    if not missing:
+        report(report_lines, f"⏭️ Skipping {os.path.basename(dir_path)}: All necessary sizes exist.")
+        return
+    if not existing:
+        report(report_lines, f"No readable icons found in {dir_path}. Skipping.")
+        return
+    
+    # Plan one icon per missing pixel size, shared by every entry of that size, without upscaling
+    source_size, iconset.source_filename = max(existing.items(), key=lambda item: item[0][0] * item[0][1])
+    base_filename = os.path.splitext(os.path.basename(dir_path))[0]
+    filled_sizes = []
+    for image, pixel_size in missing:
+        if pixel_size in existing:
+            image['filename'] = existing[pixel_size]
+        elif pixel_size[0] > source_size[0] or pixel_size[1] > source_size[1]:
+            report(report_lines, f"Skipping {image['size']}@{image.get('scale', '1x')} icon of {os.path.basename(dir_path)}: Larger than the {source_size[0]}x{source_size[1]} source.")
+            continue
+        else:
+            image['filename'] = iconset.generated.setdefault(pixel_size, icon_filename(base_filename, pixel_size))
+        filled_sizes.append(f"{pixel_size[0]}x{pixel_size[1]}")
+    if not filled_sizes:
+        return
+    iconset.apply(undo_log)
+    
+    report(report_lines, f"Done generating icons for {os.path.basename(dir_path)}: {len(filled_sizes)} entries filled with {len(iconset.generated)} new icons")
+    return filled_sizes
+
+def process_imageset(dir_path, undo_log, report_lines=None):
+    """Process an imageset or appiconset directory."""
+    if dir_path.endswith('.appiconset') and os.path.exists(os.path.join(dir_path, 'Contents.json')):
+        return process_appiconset(dir_path, undo_log, report_lines)
     if dir_path.endswith('.imageset') and os.path.exists(os.path.join(dir_path, 'Contents.json')):
-        json_path = os.path.join(dir_path, 'Contents.json')
-        data, scales = parse_contents_json(json_path, undo_log)
+        imageset = ImageSet.load(dir_path, report_lines)
+        if imageset is None:
+            return
+        scales = imageset.scales
         
         if not scales:
-            print(f"No images found in {dir_path}. Skipping.")
+            report(report_lines, f"No images found in {dir_path}. Skipping.")
             return
         
         existing_sizes = list(scales.keys())
         
         # Check if all necessary sizes exist
         if '1x' in existing_sizes and '2x' in existing_sizes and '3x' in existing_sizes:
-            print(f"⏭️ Skipping {os.path.basename(dir_path)}: All necessary sizes exist.")
+            report(report_lines, f"⏭️ Skipping {os.path.basename(dir_path)}: All necessary sizes exist.")
             return
         
-        target_sizes = {
-            '1x': (1, 1),
-            '2x': (0.5, 0.5),
-            '3x': (1/3, 1/3)
-        }
+        # Find the largest existing image to resize, probing each image only once
+        largest_filename = None
+        largest_scale = None
+        largest_size = (0, 0)
+        for size, filename in scales.items():
+            img_path = imageset.disk_path(filename)
+            if os.path.exists(img_path):  # Check if the file exists
+                img_size = get_image_size(img_path, report_lines)
+                if img_size and img_size[0] * img_size[1] > largest_size[0] * largest_size[1]:
+                    largest_size = img_size
+                    largest_scale = size
+                    largest_filename = filename
         
-        # Adjust target sizes based on the largest existing size
-        if existing_sizes:
-            max_size = max([int(size.replace('x', '')) for size in existing_sizes], default=1)
-            for size_name, size_ratio in target_sizes.items():
-                if int(size_name.replace('x', '')) > max_size:
-                    target_sizes[size_name] = (1 / max_size, 1 / max_size)
+        if not largest_filename:
+            report(report_lines, f"No readable images found in {dir_path}. Skipping.")
+            return
         
-        # Generate missing sizes
-        generated_sizes = []
-        for size_name in target_sizes:
+        # Size every missing scale relative to the largest image's scale without upscaling
+        largest_factor = int(largest_scale.replace('x', ''))
+        target_sizes = {}
+        for size_name in ['1x', '2x', '3x']:
             if size_name not in existing_sizes:
-                # Find the largest existing image to resize
-                largest_image_path = None
-                largest_size = (0, 0)
-                for size, path in scales.items():
-                    img_path = os.path.join(dir_path, path)
-                    if os.path.exists(img_path):  # Check if the file exists
-                        img_size = get_image_size(img_path)
-                        if img_size > largest_size:
-                            largest_size = img_size
-                            largest_image_path = img_path
-                
-                if largest_image_path:
-                    # Determine the file extension of the largest image
-                    _, extension = os.path.splitext(largest_image_path)
-                    base_filename = os.path.splitext(os.path.basename(largest_image_path))[0].replace('@3x', '').replace('@2x', '').replace('@1x', '').replace('x', '')
-                    
-                    generate_missing_sizes(largest_image_path, {size_name: target_sizes[size_name]}, extension, base_filename)
-                    if size_name == '1x':
-                        undo_log.append({
-                            'generated_path': os.path.join(dir_path, f"{base_filename}{extension}")
-                        })
-                    else:
-                        undo_log.append({
-                            'generated_path': os.path.join(dir_path, f"{base_filename}@{size_name}{extension}")
-                        })
-                    generated_sizes.append(size_name)
+                ratio = Fraction(min(int(size_name.replace('x', '')), largest_factor), largest_factor)
+                target_sizes[size_name] = (ratio, ratio)
         
-        # Update Contents.json
-        if '1x' in scales:
-            scales['1x'] = scales['1x'].replace('@1x', '')
-        else:
-            scales['1x'] = f"{base_filename}{extension}"
-        scales['2x'] = f"{base_filename}@2x{extension}"
-        scales['3x'] = f"{base_filename}@3x{extension}"
-        update_contents_json(json_path, scales, undo_log)
+        # Determine the file extension of the largest image
+        _, extension = os.path.splitext(largest_filename)
+        base_filename = strip_scale_suffix(os.path.splitext(largest_filename)[0])
+        
+        # Plan every missing size from a single decode of the largest image
+        generated_sizes = list(target_sizes)
+        imageset.plan_generated(largest_filename, target_sizes, extension, base_filename)
+        
+        # Plan the Contents.json update
+        imageset.plan_scales({
+            '1x': scales['1x'].replace('@1x', '') if '1x' in scales else f"{base_filename}{extension}",
+            '2x': f"{base_filename}@2x{extension}",
+            '3x': f"{base_filename}@3x{extension}",
+        })
+        imageset.apply(undo_log)
         
         # Report generated sizes for this imageset
         report_line = f"Done generating images for {os.path.basename(dir_path)} for sizes: "
         for size in ['1x', '2x', '3x']:
             if size in generated_sizes or size in existing_sizes:
                 report_line += f"{'✅' * int(size.replace('x', ''))}, "
-        print(report_line.strip(', '))
+        report(report_lines, report_line.strip(', '))
         
         return generated_sizes
 
@@ -203,12 +1034,15 @@ def undo_changes(undo_log):
     for change in reversed(undo_log):
         if 'old_path' in change:
             # Undo file rename
-            os.rename(change['new_path'], change['old_path'])
-            # print(f"Undone: Renamed {change['new_path']} back to {change['old_path']}")
-        elif 'json_backup_path' in change:
-            # Undo JSON update by restoring from backup
-            os.replace(change['json_backup_path'], change['json_path'])
-            # print(f"Undone: Restored {change['json_path']} from backup")
+            if os.path.exists(change['new_path']):
+                os.rename(change['new_path'], change['old_path'])
+                # print(f"Undone: Renamed {change['new_path']} back to {change['old_path']}")
+            else:
+                print(f"Warning: {change['new_path']} does not exist.")
+        elif 'original_json' in change:
+            # Undo JSON update by restoring the journaled content
+            write_text_atomic(change['json_path'], change['original_json'])
+            # print(f"Undone: Restored {change['json_path']}")
         elif 'generated_path' in change:
             # Delete generated images
             if os.path.exists(change['generated_path']):
@@ -218,40 +1052,469 @@ def undo_changes(undo_log):
                 print(f"Warning: {change['generated_path']} does not exist.")
     print("Finished Undoing all changes")
 
-def main(xcassets_folder):
-    """Main function to process the xcassets folder."""
+class UndoJournal:
+    """Append-only journal of undo entries, one JSON line each, that survives a crash.
+    Entries are written before the change they undo and fsynced in batches."""
+    
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.fd = os.open(journal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def __getstate__(self):
+        # Worker processes reopen the journal instead of sharing the parent's descriptor
+        return {'journal_path': self.journal_path}
+    
+    def __setstate__(self, state):
+        self.__init__(state['journal_path'])
+    
+    def append(self, change):
+        line = json.dumps(change, separators=(',', ':')) + '\n'
+        with self.lock:
+            # A single O_APPEND write keeps lines from concurrent workers whole
+            os.write(self.fd, line.encode())
+            self.unsynced += 1
+            if self.unsynced >= JOURNAL_SYNC_ENTRIES or time.monotonic() - self.last_sync >= JOURNAL_SYNC_SECONDS:
+                self.sync_locked()
+    
+    def sync(self):
+        with self.lock:
+            self.sync_locked()
+    
+    def sync_locked(self):
+        if self.unsynced:
+            os.fsync(self.fd)
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+    
+    def close(self):
+        self.sync()
+        os.close(self.fd)
+
+class JournaledUndoLog(list):
+    """Undo log that also appends every entry to an UndoJournal."""
+    
+    def __init__(self, journal):
+        super().__init__()
+        self.journal = journal
+    
+    def append(self, change):
+        self.journal.append(change)
+        super().append(change)
+
+def read_journal(journal_path):
+    """Read the undo entries of a journal, ignoring a line cut short by a crash."""
+    undo_log = []
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                undo_log.append(json.loads(line))
+            except ValueError:
+                print(f"Warning: Ignoring incomplete journal entry in {journal_path}")
+    return undo_log
+
+def undo_journal(journal_path):
+    """Undo every change recorded in a journal, then discard it."""
+    undo_changes(read_journal(journal_path))
+    os.remove(journal_path)
+
+def commit_journal(journal_path):
+    """Keep every change recorded in a journal by discarding it."""
+    os.remove(journal_path)
+    print(f"Committed changes and deleted journal: {journal_path}")
+
+def process_imageset_job(dir_path):
+    """Process an imageset in a worker and return everything main needs to merge."""
+    result = {
+        'dir_path': dir_path,
+        'generated_sizes': None,
+        'undo_log': JournaledUndoLog(undo_journal_file) if undo_journal_file is not None else [],
+        'report_lines': [],
+        'probed_sizes': {},
+        'manifest_entry': None,
+        'unchanged': False,
+        'stats': {},
+    }
+    job_stats.stats = result['stats']
+    try:
+        with span('imageset', imageset=os.path.basename(dir_path)):
+            process_imageset_with_manifest(dir_path, result)
+    except Exception as e:
+        # One broken imageset must not end the run. Its journaled changes are still undone with the others
+        report(result['report_lines'], f"Error processing {os.path.basename(dir_path)}: {e}")
+    finally:
+        job_stats.stats = None
+    result['undo_log'] = list(result['undo_log'])
+    if size_index is not None:
+        result['probed_sizes'] = size_index.take_new_entries()
+    return result
+
+def process_imageset_with_manifest(dir_path, result):
+    """Process an imageset unless the manifest shows it is unchanged, and record its new manifest entry."""
+    key = None
+    if imageset_manifest is not None and dir_path.endswith(IMAGE_SET_EXTENSIONS) and os.path.exists(os.path.join(dir_path, 'Contents.json')):
+        key = imageset_manifest.key(dir_path)
+        with span('fingerprint'):
+            fingerprint = imageset_fingerprint(dir_path)
+        if imageset_manifest.is_unchanged(key, fingerprint):
+            result['unchanged'] = True
+            result['manifest_entry'] = (key, imageset_manifest.entries[key])
+            return
+    
+    result['generated_sizes'] = process_imageset(dir_path, result['undo_log'], result['report_lines'])
+    if key is not None:
+        outputs = [os.path.basename(change['generated_path']) for change in result['undo_log'] if 'generated_path' in change]
+        with span('fingerprint'):
+            fingerprint = imageset_fingerprint(dir_path)
+        result['manifest_entry'] = (key, {'fingerprint': fingerprint, 'outputs': outputs})
+
+def iter_imagesets(xcassets_folder):
+    """Yield every .imageset and .appiconset in the catalog in a stable order as soon as it is found.
+    Does not descend into imagesets or other leaf asset folders such as .colorset."""
+    try:
+        with os.scandir(xcassets_folder) as it:
+            dirs = sorted(entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.'))
+    except OSError as e:
+        print(f"Error reading folder {xcassets_folder}: {e}")
+        return
+    for dir in dirs:
+        dir_path = os.path.join(xcassets_folder, dir)
+        extension = os.path.splitext(dir)[1]
+        if extension in IMAGE_SET_EXTENSIONS:
+            yield dir_path
+        elif extension not in LEAF_ASSET_EXTENSIONS:
+            yield from iter_imagesets(dir_path)
+
+def make_pool(jobs, executor):
+    """Start a worker pool set up with the size index, manifest, journal and options of the current run."""
+    return EXECUTORS[executor](max_workers=jobs, initializer=init_worker, initargs=(size_index, imageset_manifest, undo_journal_file, run_options))
+
+def map_imagesets(dir_paths, jobs=1, executor='thread', memory_budget=None, pool=None):
+    """Run process_imageset_job over dir_paths, yielding results in input order.
+    Jobs are submitted while dir_paths is still being produced, keeping at most a
+    few jobs per worker queued. With a memory_budget in bytes, a job is only
+    submitted while the estimated peak memory of the running jobs stays within it;
+    a job larger than the whole budget runs on its own. Pass a pool from make_pool
+    to reuse its workers instead of starting new ones."""
+    if jobs <= 1:
+        yield from map(process_imageset_job, dir_paths)
+        return
+    if pool is None:
+        with make_pool(jobs, executor) as pool:
+            yield from map_imagesets(dir_paths, jobs, executor, memory_budget, pool)
+        return
+    pending = deque()  # (future, estimated memory) in input order
+    for dir_path in dir_paths:
+        memory = estimate_imageset_memory(dir_path) if memory_budget else 0
+        while pending:
+            if len(pending) >= jobs * PENDING_JOBS_PER_WORKER:
+                yield pending.popleft()[0].result()
+                continue
+            running = [future for future, future_memory in pending if not future.done()]
+            running_memory = sum(future_memory for future, future_memory in pending if not future.done())
+            if not memory_budget or not running or running_memory + memory <= memory_budget:
+                break
+            wait(running, return_when=FIRST_COMPLETED)
+        pending.append((pool.submit(process_imageset_job, dir_path), memory))
+        while pending and pending[0][0].done():
+            yield pending.popleft()[0].result()
+    while pending:
+        yield pending.popleft()[0].result()
+
+def sidecar_stamps(catalog):
+    """Return the mtime and size of the size index and manifest, to tell if they changed on disk."""
+    stamps = []
+    for path in (catalog.size_index_path, catalog.manifest_path):
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+def load_sidecars(catalog):
+    """Load the size index and manifest of a catalog, reusing the copies kept by --serve while the files are unchanged."""
+    if warm_sidecars is not None:
+        stamps, index, manifest = warm_sidecars.get(os.path.abspath(catalog.root), (None, None, None))
+        if stamps == sidecar_stamps(catalog):
+            return index, manifest
+    return ImageSizeIndex.load(catalog.size_index_path), ImagesetManifest.load(catalog.manifest_path)
+
+def keep_sidecars_warm(catalog, index, manifest):
+    """Remember the saved size index and manifest of a catalog for the next request to --serve."""
+    if warm_sidecars is not None:
+        warm_sidecars[os.path.abspath(catalog.root)] = (sidecar_stamps(catalog), index, manifest)
+
+def start_run(catalog, force, options):
+    """Load the size index and manifest of a catalog, open its journal and set up the workers.
+    Returns the manifest and journal."""
+    index, manifest = load_sidecars(catalog)
+    if force:
+        manifest = ImagesetManifest(catalog.manifest_path)
+    if os.path.exists(catalog.journal_path):
+        print(f"Warning: Found the journal of a previous run at {catalog.journal_path}. Its changes will be undone together with this run's unless you run --commit first.")
+    journal = UndoJournal(catalog.journal_path)
+    init_worker(index, manifest, journal, options)
+    return manifest, journal
+
+def merge_result(result, undo_log, report_lines, manifest_entries, stats):
+    """Merge the result of process_imageset_job into the run and print its report lines."""
+    size_index.merge(result['probed_sizes'])
+    undo_log.extend(result['undo_log'])
+    report_lines.extend(result['report_lines'])
+    for line in result['report_lines']:
+        print(line)
+    for name, values in result['stats'].items():
+        stats.setdefault(name, []).extend(values)
+    if result['manifest_entry']:
+        key, entry = result['manifest_entry']
+        manifest_entries[key] = entry
+
+def owning_imageset(root, path):
+    """Return the .imageset or .appiconset folder containing path, or None if it is not inside one."""
+    relative_parts = os.path.relpath(path, root).split(os.sep)
+    if any(part.startswith('.') for part in relative_parts) or path.endswith('.tmp'):
+        return None  # Hidden files and temp files, such as our own atomic writes, never trigger work
+    for index, part in enumerate(relative_parts):
+        if part.endswith(IMAGE_SET_EXTENSIONS):
+            return os.path.join(root, *relative_parts[:index + 1])
+    return None
+
+class InotifyWatcher:
+    """Recursive inotify watch of a catalog through libc, Linux only."""
+    
+    def __init__(self, root):
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # Watch descriptor -> folder
+        self.add_watches(root)
+    
+    def add_watches(self, dir_path):
+        """Watch dir_path and every non-hidden folder below it."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), INOTIFY_MASK)
+        if wd < 0:
+            return
+        self.watches[wd] = dir_path
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                        self.add_watches(entry.path)
+        except OSError:
+            pass
+    
+    def read_paths(self, timeout):
+        """Wait up to timeout seconds and return the changed paths, or None if events were lost."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        paths = set()
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = struct.unpack_from('iIII', buffer, offset)
+                name = os.fsdecode(buffer[offset + 16:offset + 16 + length].rstrip(b'\0'))
+                offset += 16 + length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if wd not in self.watches or not name:
+                    continue
+                path = os.path.join(self.watches[wd], name)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self.add_watches(path)
+                paths.add(path)
+    
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback watcher that rescans the name, size and mtime of every imageset's files."""
+    
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = self.scan()
+    
+    def scan(self):
+        snapshot = {}
+        for dir_path in iter_imagesets(self.root):
+            try:
+                with os.scandir(dir_path) as it:
+                    snapshot[dir_path] = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in it if entry.is_file() and not entry.name.startswith('.'))
+            except OSError:
+                continue
+        return snapshot
+    
+    def read_paths(self, timeout):
+        """Wait up to timeout seconds, or one poll interval when timeout is None, and return the imagesets that changed since the previous poll."""
+        time.sleep(POLL_INTERVAL_SECONDS if timeout is None else timeout)
+        snapshot = self.scan()
+        changed = {dir_path for dir_path, files in snapshot.items() if self.snapshot.get(dir_path) != files}
+        self.snapshot = snapshot
+        return changed
+    
+    def close(self):
+        pass
+
+def make_watcher(root):
+    """Watch with inotify on Linux, falling back to polling elsewhere or if inotify is unavailable."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is unavailable ({e}), polling every {POLL_INTERVAL_SECONDS}s instead")
+    return PollingWatcher(root)
+
+def watch(xcassets_folder, jobs=1, executor='thread', memory_budget=None, **options):
+    """Keep the catalog up to date, reprocessing only the imagesets that change until interrupted.
+    The size index and manifest stay in memory between changes."""
+    catalog = AssetCatalog(xcassets_folder)
+    manifest, journal = start_run(catalog, False, options)
+    # One pool serves every batch, so a change does not pay for starting workers
+    pool = make_pool(jobs, executor) if jobs > 1 else None
+    
+    def process_batch(dir_paths):
+        """Process dir_paths and return how many resized images were stored in the resize cache."""
+        # The journal already holds the undo entries, so only the batch statistics are kept
+        stats = {}
+        for result in map_imagesets(dir_paths, jobs, executor, memory_budget, pool):
+            merge_result(result, [], [], manifest.entries, stats)
+        manifest.save()
+        size_index.save()
+        return sum(stats.get('cache_misses', []))
+    
+    # Catch up with changes made while nothing was watching
+    cached_images = process_batch(catalog.imagesets())
+    
+    watcher = make_watcher(xcassets_folder)
+    print(f"Watching {xcassets_folder} for changes. Press Ctrl-C to stop.")
+    try:
+        while True:
+            paths = watcher.read_paths(None)
+            if paths is None:
+                dir_paths = list(catalog.imagesets())  # Events were lost, so check every imageset
+            else:
+                # Debounce a burst of events until the catalog has been quiet for a moment
+                deadline = time.monotonic() + WATCH_MAX_DELAY_SECONDS
+                while paths is not None and time.monotonic() < deadline:
+                    more_paths = watcher.read_paths(WATCH_DEBOUNCE_SECONDS)
+                    if not more_paths:
+                        break
+                    paths |= more_paths
+                dir_paths = sorted({owning_imageset(xcassets_folder, path) for path in paths} - {None})
+            # Worker processes keep the manifest they started with, so imagesets that still match
+            # the current one, such as those only touched by our own writes, are skipped here
+            dir_paths = [dir_path for dir_path in dir_paths if os.path.isdir(dir_path) and not imageset_unchanged(manifest, dir_path)]
+            if not dir_paths:
+                continue
+            cached_images += process_batch(dir_paths)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if pool is not None:
+            pool.shutdown()
+        journal.close()
+        size_index.save()
+        if run_options['cache_dir'] and cached_images:
+            ResizeCache(run_options['cache_dir']).trim(run_options['cache_bytes'])
+    print(f"\nStopped watching. Undo the changes with --undo {catalog.journal_path} or keep them with --commit {catalog.journal_path}")
+
+def main(xcassets_folder, jobs=1, executor='thread', force=False, prompt=True, memory_budget=None, resampler='lanczos', quality_check=False, encoder='default', jpeg_quality=None, compare_encoders=False, profile=False, trace_path=None, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE_MB, auto_commit=False):
+    """Main function to process the xcassets folder. Returns the totals and statistics of the run.
+    Without a prompt, the journal is kept for a later --undo unless auto_commit is set."""
     total_populated = 0
     total_skipped = 0
+    total_unchanged = 0
     report_lines = []
     undo_log = []  # Log for undoing changes
+    catalog = AssetCatalog(xcassets_folder)
+    journal_path = catalog.journal_path
+    manifest, journal = start_run(catalog, force, {
+        'resampler': resampler,
+        'quality_check': quality_check,
+        'encoder': encoder,
+        'jpeg_quality': jpeg_quality,
+        'compare_encoders': compare_encoders,
+        'instrument': profile or bool(trace_path),
+        'trace': bool(trace_path),
+        'cache_dir': cache_dir,
+        'cache_bytes': cache_size * 1024 * 1024,
+    })
+    manifest_entries = {}
+    stats = {}
+    imageset_seconds = []
     
-    for root, dirs, files in os.walk(xcassets_folder):
-        for dir in dirs:
-            dir_path = os.path.join(root, dir)
-            generated_sizes = process_imageset(dir_path, undo_log)
-            
-            if generated_sizes:
-                total_populated += 1
-            else:
-                total_skipped += 1
+    for result in map_imagesets(catalog.imagesets(), jobs, executor, memory_budget):
+        merge_result(result, undo_log, report_lines, manifest_entries, stats)
+        if 'stage_seconds:imageset' in result['stats']:
+            imageset_seconds.append((result['stats']['stage_seconds:imageset'][0], result['dir_path']))
+        
+        if result['unchanged']:
+            total_unchanged += 1
+        elif result['generated_sizes']:
+            total_populated += 1
+        else:
+            total_skipped += 1
+    
+    journal.close()
+    size_index.save()
+    # Only a run that stored new images can have grown the cache past its size
+    trimmed_bytes = ResizeCache(cache_dir).trim(cache_size * 1024 * 1024) if cache_dir and sum(stats.get('cache_misses', [])) else 0
     
     # Generate summary report
     print("\nSummary Report:")
     print(f"Total Imagesets Populated: {total_populated}")
     print(f"Total Imagesets Skipped: {total_skipped}")
+    print(f"Total Imagesets Unchanged Since Last Run: {total_unchanged}")
+    if stats.get('psnr'):
+        print(f"{resampler} Resampler Quality vs Lanczos: {summarize_psnr(stats['psnr'])}")
+    for line in summarize_encoders(stats):
+        print(line)
+    if cache_dir:
+        print(f"Resize Cache: {sum(stats.get('cache_hits', []))} hits, {sum(stats.get('cache_misses', []))} misses, {trimmed_bytes:,} bytes of old images removed")
+    if profile:
+        for line in summarize_stages(stats, imageset_seconds):
+            print(line)
+    if trace_path:
+        write_chrome_trace(trace_path, stats.pop('trace_events', []))
+        print(f"Wrote trace to {trace_path}")
+    summary = {
+        'populated': total_populated,
+        'skipped': total_skipped,
+        'unchanged': total_unchanged,
+        'stats': stats,
+    }
+    
+    if not prompt:
+        # Keep the changes, and the journal so they can still be undone later
+        manifest.entries = manifest_entries
+        manifest.save()
+        keep_sidecars_warm(catalog, size_index, manifest)
+        if auto_commit or os.path.getsize(journal_path) == 0:
+            os.remove(journal_path)  # Committed, or nothing to undo
+        else:
+            print(f"Changes will be kept. Undo them with --undo {journal_path} or discard the journal with --commit {journal_path}")
+        return summary
     
     # Ask user if they want to undo changes
     undo_choice = input("Do you want to undo all changes? (y/n): ")
     
     if undo_choice.lower() == 'y':
-        undo_changes(undo_log)
+        # Replay the journal so changes left by an interrupted earlier run are undone too
+        undo_journal(journal_path)
     else:
-        # Delete backup JSON files if undo is not selected
-        for change in undo_log:
-            if 'json_backup_path' in change:
-                if os.path.exists(change['json_backup_path']):
-                    os.remove(change['json_backup_path'])
-                    print(f"Deleted backup: {change['json_backup_path']}")
+        # Record the kept results so unchanged imagesets are skipped next run
+        manifest.entries = manifest_entries
+        manifest.save()
+        os.remove(journal_path)
         print("Changes will be kept.")
         
         # Warning for unexpected changes
@@ -259,11 +1522,138 @@ def main(xcassets_folder):
         print("git reset --hard")
         print("git clean -fd")
         print("These commands will discard all changes and remove untracked files. Use them only if necessary.")
+    return summary
 
-if __name__ == "__main__":
+def build_parser():
     parser = argparse.ArgumentParser(description='Generate missing image sizes in Xcode asset catalogs.')
-    parser.add_argument('xcassets_folder', help='Path to the .xcassets folder.')
-    args = parser.parse_args()
+    parser.add_argument('xcassets_folder', nargs='?', help='Path to the .xcassets folder.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of imagesets to process at the same time (default: 1).')
+    parser.add_argument('--executor', choices=sorted(EXECUTORS), default='thread', help='Worker pool used when --jobs is greater than 1 (default: thread).')
+    parser.add_argument('--memory-budget', type=int, metavar='MB', help='Only start imagesets while the estimated peak memory of the running ones stays under this many megabytes.')
+    parser.add_argument('--resampler', choices=sorted(RESAMPLERS), default='lanczos', help='Resize backend: lanczos for the best quality, reduce or numpy for fast box filtering of exact 2x/3x reductions (default: lanczos).')
+    parser.add_argument('--quality-check', action='store_true', help='Report the PSNR of every resize against the Lanczos reference.')
+    parser.add_argument('--encoder', choices=list(ENCODER_PRESETS), default='default', help="Encoder preset: default for Pillow's defaults, fast for a low zlib level, ship for the smallest files (default: default).")
+    parser.add_argument('--jpeg-quality', type=int, metavar='QUALITY', help='JPEG quality from 1 to 95, overriding the encoder preset.')
+    parser.add_argument('--compare-encoders', action='store_true', help='Also encode every image with the other presets and report their sizes and encode times.')
+    parser.add_argument('--profile', action='store_true', help='Time every pipeline stage and report the totals and slowest imagesets in the summary.')
+    parser.add_argument('--trace', metavar='TRACE_JSON', help='Write every stage of every imageset as Chrome/Perfetto trace events to this file.')
+    parser.add_argument('--cache', metavar='CACHE_DIR', help='Reuse resized images from this folder, shared across runs and catalogs, and add new ones to it.')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB, metavar='MB', help=f'Remove the least recently used images from the cache once it is larger than this (default: {DEFAULT_CACHE_SIZE_MB}).')
+    parser.add_argument('--watch', action='store_true', help='Keep running and regenerate only the imagesets that change (inotify on Linux, polling elsewhere).')
+    parser.add_argument('--force', action='store_true', help='Process every imageset, even those unchanged since the last run.')
+    parser.add_argument('--no-prompt', action='store_true', help='Keep the changes without asking, leaving the journal for a later --undo or --commit.')
+    parser.add_argument('--auto-commit', action='store_true', help='Keep the changes without asking and delete the journal once the run finishes. Used by imageSizeClient.py.')
+    parser.add_argument('--undo', metavar='JOURNAL', help=f'Undo the changes recorded in a journal (e.g. <xcassets_folder>/{JOURNAL_FILENAME}).')
+    parser.add_argument('--commit', metavar='JOURNAL', help='Keep the changes recorded in a journal by deleting it.')
+    parser.add_argument('--serve', nargs='?', const=os.environ.get(SOCKET_ENV_VAR) or default_socket_path(), metavar='SOCKET', help='Keep running and serve the requests of imageSizeClient.py on a Unix socket, keeping Pillow loaded and catalog state in memory.')
+    return parser
+
+def run(args, parser):
+    """Do what the parsed command line asks for."""
+    if args.resampler == 'numpy' and numpy is None:
+        parser.error('--resampler numpy requires NumPy: pip3 install numpy')
     
-    xcassets_folder = args.xcassets_folder
-    main(xcassets_folder)
+    if args.serve:
+        serve(args.serve)
+    elif args.undo:
+        undo_journal(args.undo)
+    elif args.commit:
+        commit_journal(args.commit)
+    elif args.xcassets_folder and args.watch:
+        watch(args.xcassets_folder, args.jobs, args.executor, args.memory_budget * 1024 * 1024 if args.memory_budget else None,
+              resampler=args.resampler, quality_check=args.quality_check, encoder=args.encoder, jpeg_quality=args.jpeg_quality,
+              cache_dir=args.cache, cache_bytes=args.cache_size * 1024 * 1024)
+    elif args.xcassets_folder:
+        xcassets_folder = args.xcassets_folder
+        memory_budget = args.memory_budget * 1024 * 1024 if args.memory_budget else None
+        main(xcassets_folder, args.jobs, args.executor, args.force, not (args.no_prompt or args.auto_commit), memory_budget, args.resampler, args.quality_check, args.encoder, args.jpeg_quality, args.compare_encoders, args.profile, args.trace, args.cache, args.cache_size, args.auto_commit)
+    else:
+        parser.error('the xcassets_folder argument is required unless --undo or --commit is used')
+
+def default_socket_path():
+    return os.path.join(tempfile.gettempdir(), f"imageSizeGenerator-{os.getuid()}.sock")
+
+class ServiceWriter(io.TextIOBase):
+    """Text stream forwarding what a served run prints to the client, one JSON line per write."""
+    
+    def __init__(self, conn, stream):
+        self.conn = conn
+        self.stream = stream  # 'out' or 'err'
+    
+    def write(self, text):
+        if text:
+            with contextlib.suppress(OSError):  # Keep running if the client went away
+                self.conn.sendall((json.dumps({self.stream: text}) + '\n').encode())
+        return len(text)
+
+def handle_request(conn):
+    """Run the command line sent by imageSizeClient.py, streaming its output and exit code back."""
+    try:
+        with conn.makefile('r', encoding='utf-8') as f:
+            request = json.loads(f.readline())
+        argv, request_cwd = request['argv'], request['cwd']
+    except (OSError, ValueError, TypeError, KeyError):
+        # Probes, cancelled builds and broken clients close or send garbage without a request
+        with contextlib.suppress(OSError):
+            conn.sendall((json.dumps({'err': 'Error: Invalid request\n'}) + '\n' + json.dumps({'exit': 2}) + '\n').encode())
+        return
+    exit_code = 0
+    cwd = os.getcwd()
+    with contextlib.redirect_stdout(ServiceWriter(conn, 'out')), contextlib.redirect_stderr(ServiceWriter(conn, 'err')):
+        try:
+            os.chdir(request_cwd)
+            parser = build_parser()
+            args = parser.parse_args(argv)
+            if args.watch or args.serve:
+                parser.error('--watch and --serve are not supported through imageSizeClient.py')
+            # The client cannot answer a prompt, and build runs would pile up journal entries without a commit
+            args.auto_commit = not args.no_prompt
+            run(args, parser)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os.chdir(cwd)
+    with contextlib.suppress(OSError):
+        conn.sendall((json.dumps({'exit': exit_code}) + '\n').encode())
+
+def serve(socket_path):
+    """Serve imageSizeClient.py requests one at a time on a Unix socket until interrupted.
+    Pillow stays imported and the size index and manifest of every catalog stay in memory."""
+    global warm_sidecars
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)  # Left behind by a service that did not shut down cleanly
+            else:
+                sys.exit(f"A service is already listening on {socket_path}")
+    warm_sidecars = {}
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # Only this user may connect
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    print(f"Serving on {socket_path}. Press Ctrl-C to stop.")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    handle_request(conn)
+                except Exception:
+                    traceback.print_exc()  # One bad request must not stop the service
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+if __name__ == "__main__":
+    parser = build_parser()
+    run(parser.parse_args(), parser)